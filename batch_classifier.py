@@ -0,0 +1,261 @@
+import os
+
+import stashapi.log as log
+
+from body_tags import *
+from plugin_state import load_json, save_json, remove_file
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+# parsed PerformerRecord attributes loaded as float columns, falsy values become nan
+METRIC_COLUMNS = ("band", "bust", "waist", "hips", "height_cm", "weight", "bmi", "breast_volume")
+
+# one file per snapshot column, float64 keeps threshold comparisons identical to the scalar engine
+SNAPSHOT_COLUMNS = [("id", "i8"), ("cup", "i2"), ("ethnicity", "i2"), ("female", "?")] + [(name, "f8") for name in METRIC_COLUMNS]
+
+class PerformerColumns:
+    """parsed performer metrics held column wise so a whole batch can be classified at once
+
+    ethnicity holds codes into ethnicities, the title cased regions used to pick regional rules
+    """
+
+    def __init__(self, ids, cup, ethnicity, ethnicities, female, **metrics) -> None:
+        self.ids = ids
+        self.cup = cup
+        self.ethnicity = ethnicity
+        self.ethnicities = ethnicities
+        self.female = female
+        for name in METRIC_COLUMNS:
+            setattr(self, name, metrics[name])
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_performers(cls, performers, ethnicity_codes=None):
+        """builds columns from PerformerRecord objects parsed with classify=False
+
+        ethnicity_codes maps regions to codes, pass the same dict to keep codes stable across pages
+        """
+        if ethnicity_codes is None:
+            ethnicity_codes = {}
+        ids, cup, ethnicity, female = [], [], [], []
+        metrics = {name: [] for name in METRIC_COLUMNS}
+        for p in performers:
+            ids.append(p.id)
+            cup.append(BreastCup.threshold_index.match_position(p.cupsize) if p.cupsize else -1)
+            ethnicity.append(ethnicity_codes.setdefault(p.region(), len(ethnicity_codes)))
+            female.append(p.gender == 'FEMALE')
+            for name in METRIC_COLUMNS:
+                metrics[name].append(getattr(p, name) or np.nan)
+        return cls(
+            np.array(ids, dtype=object),
+            np.array(cup, dtype=np.int64),
+            np.array(ethnicity, dtype=np.int16),
+            list(ethnicity_codes),
+            np.array(female, dtype=bool),
+            **{name: np.array(values, dtype=np.float64) for name, values in metrics.items()}
+        )
+
+def has_value(column):
+    return ~np.isnan(column)
+
+def match_threshold_indexes(enum_class, values, valid):
+    """vectorized StashTagEnumComparable.match_threshold, returns the index of the matched member or -1"""
+    index = enum_class.threshold_index
+    if not index.breakpoints:
+        return np.full(len(values), -1, dtype=np.int64)
+    breakpoints = np.array(index.breakpoints, dtype=np.float64)
+    i = np.searchsorted(breakpoints, values, side="left")
+    on_breakpoint = breakpoints[np.minimum(i, len(breakpoints) - 1)] == values
+    point_positions = np.array(index.point_positions + [-1], dtype=np.int64)
+    interval_positions = np.array(index.interval_positions, dtype=np.int64)
+    indexes = np.where(on_breakpoint, point_positions[i], interval_positions[i])
+    return np.where(valid, indexes, -1)
+
+def indexes_to_masks(enum_class, indexes):
+    return {enum: indexes == i for i, enum in enumerate(enum_class)}
+
+def region_rows(c, regions):
+    """maps each region to its rows, ethnicities without their own entry fall under Default"""
+    rows = {}
+    listed = np.zeros(len(c), dtype=bool)
+    for region in regions:
+        if region != "Default":
+            code = c.ethnicities.index(region) if region in c.ethnicities else -1
+            rows[region] = c.ethnicity == code
+            listed |= rows[region]
+    rows["Default"] = ~listed
+    return rows
+
+def calculate_bmi_masks(c):
+    """vectorized calculate_bmi(), including the regional cut-offs"""
+    valid = has_value(c.bmi) & (c.bmi >= 1)
+    indexes = np.full(len(c), -1, dtype=np.int64)
+    for region, rows in region_rows(c, RULES.bmi_breakpoints).items():
+        rows = rows & valid
+        indexes[rows] = np.searchsorted(RULES.bmi_breakpoints_for(region), c.bmi[rows], side="right")
+    return indexes_to_masks(BodyMassIndex, indexes)
+
+def calculate_hip_size_masks(c):
+    """vectorized calculate_hip_size()"""
+    remaining = has_value(c.waist) & has_value(c.hips)
+    whr = c.waist / c.hips
+    masks = []
+    for hip_size, bound in RULES.hip_sizes:
+        mask = remaining if bound is None else remaining & (whr > bound)
+        remaining = remaining & ~mask
+        masks.append((hip_size, mask))
+    return masks
+
+def calculate_shape_masks(c):
+    """vectorized calculate_shape(), a performer may match several shapes"""
+    valid = has_value(c.bust) & has_value(c.waist) & has_value(c.hips)
+    return RULES.shape_masks(c.bust, c.waist, c.hips, valid)
+
+def height_limits(c):
+    """per row (short, tall) height thresholds from the regional height rules"""
+    short = np.empty(len(c), dtype=np.float64)
+    tall = np.empty(len(c), dtype=np.float64)
+    for region, rows in region_rows(c, RULES.height_limits).items():
+        short[rows], tall[rows] = RULES.height_limits_for(region)
+    return short, tall
+
+def height_type_masks(c, short, tall):
+    """vectorized height type of classify_measurements()"""
+    valid = has_value(c.height_cm) & c.female
+    low, high = RULES.average_height
+    average = valid & (c.height_cm > low) & (c.height_cm < high)
+    is_short = valid & ~average & (c.height_cm <= short)
+    is_tall = valid & ~average & ~is_short & (c.height_cm >= tall)
+    # HeightType members may be aliases of each other, combine rather than overwrite
+    masks = {enum: np.zeros(len(c), dtype=bool) for enum in HeightType}
+    for enum, mask in ((HeightType.AVERAGE, average), (HeightType.SHORT, is_short), (HeightType.TALL, is_tall)):
+        masks[enum] = masks[enum] | mask
+    return masks
+
+def body_type_masks(c, shape_masks, short):
+    """vectorized body type of classify_measurements()"""
+    masks = indexes_to_masks(BodyType, match_threshold_indexes(BodyType, c.bmi, has_value(c.bmi)))
+
+    petite = masks[BodyType.FIT] & (c.height_cm <= short)
+    masks[BodyType.FIT] &= ~petite
+    masks[BodyType.PETITE] |= petite
+
+    curvy_shape = np.zeros(len(c), dtype=bool)
+    for body_shape in CURVY_SHAPES:
+        curvy_shape |= shape_masks[body_shape]
+    curvy = masks[BodyType.AVERAGE] & curvy_shape
+    masks[BodyType.AVERAGE] &= ~curvy
+    masks[BodyType.CURVY] |= curvy
+    return masks
+
+def classify_columns(c):
+    """classifies every performer in c at once, returns a mask of matching rows for each tag enum
+
+    gives the same tags as StashPerformer.classify() for every performer
+    """
+    shape_masks = calculate_shape_masks(c)
+    short, tall = height_limits(c)
+    masks = {}
+    for enum_masks in (
+        calculate_bmi_masks(c).items(),
+        indexes_to_masks(BreastSize, match_threshold_indexes(BreastSize, c.breast_volume, has_value(c.breast_volume))).items(),
+        indexes_to_masks(BreastCup, c.cup).items(),
+        calculate_hip_size_masks(c),
+        indexes_to_masks(ButtSize, match_threshold_indexes(ButtSize, c.hips, has_value(c.hips))).items(),
+        height_type_masks(c, short, tall).items(),
+        shape_masks.items(),
+        body_type_masks(c, shape_masks, short).items(),
+    ):
+        # members with equal values are enum aliases (e.g. HipSize), their masks are combined
+        for enum, mask in enum_masks:
+            masks[enum] = masks[enum] | mask if enum in masks else mask
+    return masks
+
+def get_tag_updates(performers, tag_updates):
+    """batch equivalent of StashPerformer.get_tag_updates() for a list of parsed performers"""
+    return columns_tag_updates(PerformerColumns.from_performers(performers), tag_updates)
+
+def columns_tag_updates(c, tag_updates):
+    if not len(c):
+        return tag_updates
+    with np.errstate(invalid="ignore", divide="ignore"):
+        masks = classify_columns(c)
+    for enum, mask in masks.items():
+        if mask.any():
+            # snapshot ids are stored as integers, stash expects string ids
+            tag_updates[enum].extend(str(performer_id) for performer_id in c.ids[mask].tolist())
+    return tag_updates
+
+def column_path(path, name):
+    """file holding one snapshot column, next to the snapshot index at path"""
+    return f"{os.path.splitext(path)[0]}.{name}.bin"
+
+class SnapshotWriter:
+    """appends the metrics of each page of parsed performers to one file per column
+
+    only the current page is held in memory. The index at path, naming the row count, column
+    types and ethnicities, is written last so a reader never sees a partially written snapshot
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+        self.files = {}
+        self.ethnicity_codes = {}
+        self.rows = 0
+
+    def __enter__(self):
+        self.files = {name: open(f"{column_path(self.path, name)}.tmp", "wb") for name, _ in SNAPSHOT_COLUMNS}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for f in self.files.values():
+            f.close()
+        if exc_type:
+            for f in self.files.values():
+                os.remove(f.name)
+            return
+        remove_file(self.path)
+        for name, f in self.files.items():
+            os.replace(f.name, column_path(self.path, name))
+        save_json(self.path, {
+            "rows": self.rows,
+            "columns": dict(SNAPSHOT_COLUMNS),
+            "ethnicities": list(self.ethnicity_codes),
+        })
+
+    def add(self, performers):
+        """appends parsed PerformerRecord objects"""
+        c = PerformerColumns.from_performers(performers, ethnicity_codes=self.ethnicity_codes)
+        for name, dtype in SNAPSHOT_COLUMNS:
+            # stash ids are numeric strings, stored as integers
+            values = [int(performer_id) for performer_id in c.ids] if name == "id" else getattr(c, name)
+            self.files[name].write(np.asarray(values, dtype=dtype).tobytes())
+        self.rows += len(c)
+
+def load_snapshot(path):
+    """memory-maps the snapshot saved at path as PerformerColumns, returns None if there is none"""
+    index = load_json(path)
+    if index is None:
+        return None
+    if index.get("columns") != dict(SNAPSHOT_COLUMNS):
+        log.warning(f"Snapshot at {path} was saved by another version of the plugin, run 'Calculate' to save it again")
+        return None
+    rows = index["rows"]
+    columns = {}
+    for name, dtype in SNAPSHOT_COLUMNS:
+        if not rows:
+            # an empty file cannot be memory-mapped
+            columns[name] = np.empty(0, dtype=dtype)
+            continue
+        try:
+            columns[name] = np.memmap(column_path(path, name), dtype=dtype, mode="r", shape=(rows,))
+        except (FileNotFoundError, ValueError):
+            log.warning(f"Snapshot at {path} is missing column {name}, run 'Calculate' to save it again")
+            return None
+    return PerformerColumns(
+        columns.pop("id"), columns.pop("cup"), columns.pop("ethnicity"), index["ethnicities"], columns.pop("female"), **columns
+    )
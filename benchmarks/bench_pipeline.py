@@ -0,0 +1,154 @@
+"""throughput and peak memory of each stage of the parse/classify/write path on synthetic performers
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 10000 100000 --seed 7 --stages parse classify_scalar
+
+each stage is timed on its own first, then repeated under tracemalloc to find its peak
+memory so tracing overhead does not skew the throughput numbers. --no-memory skips that pass.
+classify_numpy is also checked against the scalar engine and exits on any performer tagged differently
+"""
+import gc, sys, time, argparse, tempfile, tracemalloc
+from collections import defaultdict
+
+from common import config, silence_log, redirect_state_files
+from synthetic import synthetic_performers
+from fake_stash import FakeStash
+
+import performer_body_calculator as pbc
+from performer_calculator import classify_performers, parse_measurement_string, measurement_cache_stats
+from body_tags import clear_classification_cache
+import batch_classifier
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+def pages(performers, page_size):
+    for i in range(0, len(performers), page_size):
+        yield performers[i:i + page_size]
+
+def stage_generate(performers, seed):
+    return list(synthetic_performers(len(performers), seed))
+
+def stage_parse(performers, seed):
+    clear_caches()
+    unparsed = failed = 0
+    for p in performers:
+        if measurements := p["measurements"].replace(" ", ""):
+            try:
+                if parse_measurement_string(measurements) is None:
+                    unparsed += 1
+            except Exception:
+                failed += 1
+    return {"unparsed": unparsed, "failed": failed, **measurement_cache_stats()}
+
+def clear_caches():
+    """starts a stage cold, otherwise earlier passes, stages and sizes sharing a seed warm the caches"""
+    parse_measurement_string.cache_clear()
+    clear_classification_cache()
+
+def classify_with(engine, performers):
+    clear_caches()
+    config.CLASSIFIER_ENGINE = engine
+    tag_updates = defaultdict(list)
+    for page in pages(performers, getattr(config, "PERFORMER_PAGE_SIZE", 1000)):
+        for enum, ids in classify_performers(page).items():
+            tag_updates[enum].extend(ids)
+    return {"tagged": sum(len(ids) for ids in tag_updates.values())}
+
+def engine_tags(engine, performers):
+    config.CLASSIFIER_ENGINE = engine
+    tag_ids = defaultdict(set)
+    for page in pages(performers, getattr(config, "PERFORMER_PAGE_SIZE", 1000)):
+        for enum, ids in classify_performers(page).items():
+            tag_ids[enum].update(ids)
+    return tag_ids
+
+def check_engines(performers):
+    """exits when the numpy engine tags any performer differently from the scalar engine"""
+    scalar, batch = engine_tags("scalar", performers), engine_tags("numpy", performers)
+    differences = {str(enum): len(scalar[enum] ^ batch[enum]) for enum in set(scalar) | set(batch)}
+    differences = {enum: count for enum, count in differences.items() if count}
+    if differences:
+        raise SystemExit(f"classify_numpy tags differ from classify_scalar, performers per tag: {differences}")
+    return {"matches_scalar": sum(len(ids) for ids in scalar.values())}
+
+def stage_classify_scalar(performers, seed):
+    return classify_with("scalar", performers)
+
+def stage_classify_numpy(performers, seed):
+    return classify_with("numpy", performers)
+
+def run_plugin(performers, mode):
+    stash = FakeStash(performers)
+    pbc.main(stash_in=stash, mode_in=mode)
+    # a second run over unchanged performers should only fetch
+    first_calls, first_written = dict(stash.calls), stash.ids_written
+    pbc.main(stash_in=stash, mode_in=mode)
+    return {
+        "first_run_calls": first_calls,
+        "first_run_ids_written": first_written,
+        "second_run_ids_written": stash.ids_written - first_written,
+    }
+
+def stage_run_calculator(performers, seed):
+    clear_caches()
+    config.CLASSIFIER_ENGINE = "scalar"
+    return run_plugin(performers, "run_calculator")
+
+STAGES = {
+    "generate": stage_generate,
+    "parse": stage_parse,
+    "classify_scalar": stage_classify_scalar,
+    "classify_numpy": stage_classify_numpy,
+    "run_calculator": stage_run_calculator,
+}
+
+def measure(stage, performers, seed, memory=True):
+    gc.collect()
+    started = time.perf_counter()
+    details = stage(performers, seed)
+    elapsed = time.perf_counter() - started
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        stage(performers, seed)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak, details
+
+def format_row(name, size, elapsed, peak):
+    peak_mb = f"{peak / 2**20:10.1f}" if peak is not None else f"{'-':>10}"
+    return f"{name:<18}{size:>10}{elapsed:>10.2f}{size / elapsed if elapsed else 0:>14,.0f}{peak_mb}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the parse/classify/write path on synthetic performers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="performer counts to benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic performers")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="stages to run")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    silence_log()
+    stages = [name for name in args.stages if name != "classify_numpy" or batch_classifier.np is not None]
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        redirect_state_files(pbc, state_dir)
+
+        print(f"{'stage':<18}{'performers':>10}{'seconds':>10}{'performers/s':>14}{'peak MB':>10}")
+        for size in args.sizes:
+            performers = list(synthetic_performers(size, args.seed))
+            for name in stages:
+                for path in (pbc.STATE_FILE, pbc.TAG_CACHE_FILE):
+                    pbc.remove_file(path)
+                elapsed, peak, details = measure(STAGES[name], performers, args.seed, memory=not args.no_memory)
+                print(format_row(name, size, elapsed, peak))
+                if isinstance(details, dict):
+                    print(f"{'':<18}{details}")
+                if name == "classify_numpy":
+                    # checked outside the timed stage, numpy must give the same tags as the scalar engine
+                    print(f"{'':<18}{check_engines(performers)}")
+                sys.stdout.flush()
+
+if __name__ == '__main__':
+    main()
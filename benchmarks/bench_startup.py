@@ -0,0 +1,51 @@
+"""time from process start until each task mode has finished against an empty stash
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeat 20 --modes destroy_managed_tags run_calculator_incremental
+
+every sample is a fresh interpreter, as stash spawns one per task, so import costs are included
+"""
+import os, sys, json, time, argparse, statistics, subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODES = ("import", "destroy_managed_tags", "run_calculator_incremental", "run_calculator")
+
+SAMPLE = """
+import sys, json, time, tempfile
+started = time.perf_counter()
+sys.path.insert(0, {bench_dir!r})
+from common import silence_log, redirect_state_files
+import performer_body_calculator as pbc
+mode = {mode!r}
+if mode != "import":
+    from fake_stash import FakeStash
+    silence_log()
+    with tempfile.TemporaryDirectory() as state_dir:
+        redirect_state_files(pbc, state_dir)
+        pbc.main(stash_in=FakeStash(), mode_in=mode)
+print(json.dumps({{"seconds": time.perf_counter() - started, "modules": len(sys.modules), "numpy": "numpy" in sys.modules}}))
+"""
+
+def sample(mode):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", SAMPLE.format(bench_dir=BENCH_DIR, mode=mode)], capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    return wall, json.loads(result.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark plugin startup for each task mode")
+    parser.add_argument("--repeat", type=int, default=10, help="fresh interpreters per mode")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES), help="modes to run")
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<28}{'wall ms':>10}{'in-process ms':>15}{'modules':>9}{'numpy':>7}")
+    for mode in args.modes:
+        samples = [sample(mode) for _ in range(args.repeat)]
+        wall = statistics.median(wall for wall, _ in samples) * 1000
+        in_process = statistics.median(s["seconds"] for _, s in samples) * 1000
+        last = samples[-1][1]
+        print(f"{mode:<28}{wall:>10.1f}{in_process:>15.1f}{last['modules']:>9}{str(last['numpy']):>7}")
+
+if __name__ == '__main__':
+    main()
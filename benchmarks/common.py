@@ -0,0 +1,30 @@
+import os, sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+# benchmarks run against the users config.py, falling back to the example config
+try:
+    import config
+except ModuleNotFoundError:
+    import example_config as config
+    sys.modules["config"] = config
+
+import stashapi.log as log
+
+import plugin_state
+
+def silence_log():
+    """replaces stashapi log output with no-ops so logging does not skew timings"""
+    for level in ("trace", "debug", "info", "warning", "error", "progress"):
+        setattr(log, level, lambda *args, **kwargs: None)
+
+def redirect_state_files(module, directory):
+    """points every plugin_state *_FILE path used by module into directory
+
+    the plugin keeps its state next to itself, benchmarks must not touch the real plugin directory
+    """
+    for name in dir(plugin_state):
+        if name.endswith("_FILE"):
+            setattr(module, name, os.path.join(directory, os.path.basename(getattr(plugin_state, name))))
@@ -0,0 +1,224 @@
+import re, json, time, random, functools, threading
+from collections import Counter
+
+class InjectedFailure(Exception):
+    pass
+
+def payload_size(payload):
+    return len(json.dumps(payload, separators=(",", ":"), default=str))
+
+def request(method):
+    """counts a call as one GraphQL request, with optional latency, failures and payload sizes"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        name = method.__name__
+        with self.lock:
+            self.calls[name] += 1
+            fail = name in self.failing_methods and self.random.random() < self.failure_rate
+            if self.measure_bytes:
+                self.bytes_sent += payload_size([args, kwargs])
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            with self.lock:
+                self.failures[name] += 1
+            raise InjectedFailure(f"injected {name} failure")
+        result = method(self, *args, **kwargs)
+        if self.measure_bytes:
+            size = payload_size(result)
+            with self.lock:
+                self.bytes_received += size
+        return result
+    return wrapper
+
+class FakeStash:
+    """in-memory stand-in for StashInterface covering the calls the plugin makes
+
+    every call is counted in self.calls, performers are plain dicts as returned for
+    PERFORMER_FRAGMENT and their tags are held as sets of tag ids.
+
+    latency (seconds) is added to every request and failure_rate of the requests to
+    failing_methods raise InjectedFailure, measure_bytes sums the JSON size of every
+    request and response
+    """
+    def __init__(self, performers=(), latency=0.0, failure_rate=0.0, failing_methods=("update_performers",), measure_bytes=False, seed=0) -> None:
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failing_methods = set(failing_methods)
+        self.measure_bytes = measure_bytes
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.failures = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.tags = {}
+        self.performers = {}
+        self.performer_tags = {}
+        self.ids_written = 0
+        self.lock = threading.Lock()
+        self._version = 0
+        self._filter_cache = {}
+        for p in performers:
+            self.add_performer(p)
+
+    def add_performer(self, performer):
+        performer = dict(performer)
+        self.performer_tags[performer["id"]] = {t["id"] for t in performer.pop("tags", [])}
+        self.performers[performer["id"]] = performer
+        self._changed()
+
+    def _changed(self, tags_only=False):
+        self._version += 1
+        if not tags_only:
+            self._filter_cache.clear()
+            return
+        # tag writes only move performers in and out of filters on tags
+        for key in [key for key in self._filter_cache if '"tags"' in key]:
+            del self._filter_cache[key]
+
+    # tags
+
+    @request
+    def find_tags(self, f={}, filter={}, q="", fragment=None, get_count=False):
+        tags = list(self.tags.values())
+        if "description" in f:
+            pattern = re.compile(f["description"]["value"])
+            tags = [t for t in tags if pattern.search(t["description"])]
+        tags = [dict(t) for t in tags]
+        return (len(tags), tags) if get_count else tags
+
+    @request
+    def find_tag(self, tag_in, create=False, fragment=None, on_multiple=None):
+        name = tag_in if isinstance(tag_in, str) else tag_in["name"]
+        for t in self.tags.values():
+            if t["name"] == name or name in t["aliases"]:
+                return dict(t)
+        if create and not isinstance(tag_in, str):
+            return self._create_tag(tag_in)
+        return None
+
+    @request
+    def create_tag(self, tag_in):
+        return self._create_tag(tag_in)
+
+    def _create_tag(self, tag_in):
+        tag_id = str(len(self.tags) + 1)
+        while tag_id in self.tags:
+            tag_id = str(int(tag_id) + 1)
+        self.tags[tag_id] = {
+            "id": tag_id,
+            "name": tag_in["name"],
+            "aliases": list(tag_in.get("aliases", [])),
+            "description": tag_in.get("description", ""),
+        }
+        return dict(self.tags[tag_id])
+
+    @request
+    def destroy_tags(self, tag_ids):
+        tag_ids = set(tag_ids)
+        for tag_id in tag_ids:
+            self.tags.pop(tag_id, None)
+        for held in self.performer_tags.values():
+            held -= tag_ids
+        self._changed()
+
+    @request
+    def call_GQL(self, query, variables={}, callback=None):
+        result = {}
+        for alias, key in re.findall(r"(\w+): tagCreate\(input: \$(\w+)\)", query):
+            result[alias] = self._create_tag(variables[key])
+        return result
+
+    # performers
+
+    def _response(self, performer_id, fragment):
+        if fragment and fragment.strip() == "id":
+            return {"id": performer_id}
+        return {**self.performers[performer_id], "tags": [{"id": t} for t in self.performer_tags[performer_id]]}
+
+    def _matches(self, performer_id, f):
+        p = self.performers[performer_id]
+        for key, criterion in f.items():
+            if key in ("AND", "OR", "NOT"):
+                continue
+            value = criterion.get("value")
+            modifier = criterion.get("modifier")
+            if key == "tags":
+                ok = bool(self.performer_tags[performer_id].intersection(value))
+            elif modifier == "NOT_NULL":
+                ok = bool(p.get(key))
+            elif modifier == "GREATER_THAN":
+                ok = p.get(key) is not None and p[key] > value
+            elif modifier == "EQUALS":
+                ok = p.get(key) == value
+            else:
+                raise ValueError(f"FakeStash does not support filtering {key} with {modifier}")
+            if not ok:
+                break
+        else:
+            ok = True
+        if "AND" in f:
+            ok = ok and self._matches(performer_id, f["AND"])
+        if "NOT" in f:
+            ok = ok and not self._matches(performer_id, f["NOT"])
+        if "OR" in f:
+            ok = ok or self._matches(performer_id, f["OR"])
+        return ok
+
+    def _filter_ids(self, f):
+        # every page of a listing reuses the same filter, only evaluate it once per data version
+        key = json.dumps(f, sort_keys=True)
+        if key not in self._filter_cache:
+            self._filter_cache[key] = [p_id for p_id in self.performers if not f or self._matches(p_id, f)]
+        return self._filter_cache[key]
+
+    @request
+    def find_performers(self, f={}, filter={"per_page": -1}, q="", fragment=None, get_count=False, callback=None):
+        # pages are read while tag updates may be written from other threads
+        with self.lock:
+            ids = self._filter_ids(f)
+            per_page = filter.get("per_page", -1)
+            if per_page > 0:
+                start = (filter.get("page", 1) - 1) * per_page
+                page_ids = ids[start:start + per_page]
+            else:
+                page_ids = ids
+            performers = [self._response(p_id, fragment) for p_id in page_ids]
+        return (len(ids), performers) if get_count else performers
+
+    @request
+    def find_performer(self, performer_in, create=False, fragment=None, on_multiple=None):
+        performer_id = str(performer_in["id"] if isinstance(performer_in, dict) else performer_in)
+        if performer_id not in self.performers:
+            return None
+        return self._response(performer_id, fragment)
+
+    @request
+    def update_performers(self, bulk_update_input):
+        tag_ids = set(bulk_update_input["tag_ids"]["ids"])
+        mode = bulk_update_input["tag_ids"]["mode"]
+        with self.lock:
+            for performer_id in bulk_update_input["ids"]:
+                held = self.performer_tags[str(performer_id)]
+                if mode == "ADD":
+                    held |= tag_ids
+                elif mode == "REMOVE":
+                    held -= tag_ids
+                else:
+                    held.clear()
+                    held |= tag_ids
+            self.ids_written += len(bulk_update_input["ids"])
+            self._changed(tags_only=True)
+
+    @request
+    def update_performer(self, performer_in):
+        with self.lock:
+            if "tag_ids" in performer_in:
+                self.performer_tags[str(performer_in["id"])] = set(performer_in["tag_ids"])
+            self.ids_written += 1
+            self._changed(tags_only=True)
+        return self._response(str(performer_in["id"]), None)
+
+    def tag_names(self):
+        """performer id to sorted tag names, used to compare the result of two runs"""
+        return {p_id: sorted(self.tags[t]["name"] for t in held) for p_id, held in self.performer_tags.items()}
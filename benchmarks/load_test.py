@@ -0,0 +1,79 @@
+"""end to end runs of the plugin against a FakeStash with injected latency and failures
+
+    python benchmarks/load_test.py --performers 100000 --latency-ms 20 --failure-rate 0.05
+    python benchmarks/load_test.py --modes run_calculator run_calculator_incremental destroy_managed_tags
+    python benchmarks/load_test.py --latency-ms 50 --pipeline
+
+every mode is run in order through main(stash_in=..., mode_in=...) against the same fake stash,
+so later modes see the tags written by earlier ones
+"""
+import time, argparse, tempfile
+
+from common import config, silence_log, redirect_state_files
+from synthetic import synthetic_performers
+from fake_stash import FakeStash
+
+import performer_body_calculator as pbc
+
+def format_bytes(n):
+    return f"{n / 2**20:.1f} MB" if n >= 2**20 else f"{n / 2**10:.1f} KB"
+
+def run_mode(stash, mode):
+    calls_before = stash.calls.copy()
+    failures_before = stash.failures.copy()
+    sent_before, received_before = stash.bytes_sent, stash.bytes_received
+
+    started = time.perf_counter()
+    error = None
+    try:
+        pbc.main(stash_in=stash, mode_in=mode)
+    except Exception as e:
+        error = e
+    elapsed = time.perf_counter() - started
+
+    calls = stash.calls - calls_before
+    failures = stash.failures - failures_before
+    print(f"{mode}: {elapsed:.2f}s, {sum(calls.values())} requests, "
+          f"{format_bytes(stash.bytes_sent - sent_before)} sent, {format_bytes(stash.bytes_received - received_before)} received")
+    for method, count in sorted(calls.items()):
+        failed = f" ({failures[method]} failed)" if failures[method] else ""
+        print(f"  {method:<20}{count:>8}{failed}")
+    if stats := getattr(pbc, "stats", None):
+        print("  stages: " + " ".join(f"{name} {seconds:.2f}s" for name, seconds in stats.stage_times.items()))
+    if error:
+        print(f"  failed: {type(error).__name__}: {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the plugin against an in-memory stash")
+    parser.add_argument("--performers", type=int, default=10_000, help="number of synthetic performers")
+    parser.add_argument("--seed", type=int, default=0, help="seed for performers and failures")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latency added to every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of failing requests")
+    parser.add_argument("--failing-methods", nargs="+", default=["update_performers"], help="requests that may fail")
+    parser.add_argument("--modes", nargs="+", default=["run_calculator", "run_calculator_incremental"], help="task modes to run in order")
+    parser.add_argument("--pipeline", action="store_true", help="send tag updates while performers are fetched (PIPELINE_WRITES)")
+    parser.add_argument("--verbose", action="store_true", help="keep the plugin log output")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        silence_log()
+    config.PIPELINE_WRITES = args.pipeline
+
+    stash = FakeStash(
+        synthetic_performers(args.performers, args.seed),
+        latency=args.latency_ms / 1000,
+        failure_rate=args.failure_rate,
+        failing_methods=args.failing_methods,
+        measure_bytes=True,
+        seed=args.seed,
+    )
+    print(f"{args.performers} performers, {args.latency_ms:g}ms latency, {args.failure_rate:.0%} failures of {', '.join(args.failing_methods)}"
+          + (", pipelined writes" if args.pipeline else ""))
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        redirect_state_files(pbc, state_dir)
+        for mode in args.modes:
+            run_mode(stash, mode)
+
+if __name__ == '__main__':
+    main()
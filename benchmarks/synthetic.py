@@ -0,0 +1,50 @@
+import random
+
+CUPS = ["AA", "A", "B", "C", "D", "DD", "E", "F", "DDD", "G", "H"]
+ETHNICITIES = ["Caucasian", "Asian", "Latin", "Black", "Mixed", ""]
+MALFORMED = ["34-24", "big", "34Z-24-34", "34C-24", "C-24-34", "34C/24/34"]
+
+def random_measurements(rnd):
+    """covers every format parse_measurement_string() handles plus empty and malformed values"""
+    kind = rnd.random()
+    band = rnd.randint(30, 38)
+    cup = rnd.choice(CUPS)
+    waist = rnd.randint(22, 32)
+    hips = rnd.randint(30, 42)
+    if kind < 0.40:
+        # band, cup, waist, hips "34C-24-34"
+        return f"{band}{cup}-{waist}-{hips}"
+    if kind < 0.50:
+        # metric band, cup, waist, hips "86C-61-86"
+        return f"{round(band * 2.54)}{cup}-{round(waist * 2.54)}-{round(hips * 2.54)}"
+    if kind < 0.62:
+        # fashion bust, waist, hips "36-24-34"
+        return f"{band + rnd.randint(1, 6)}-{waist}-{hips}"
+    if kind < 0.67:
+        # metric fashion "91-61-86"
+        return f"{round((band + rnd.randint(1, 6)) * 2.54)}-{round(waist * 2.54)}-{round(hips * 2.54)}"
+    if kind < 0.77:
+        # bra only "34C" or "34C (86C)"
+        return f"{band}{cup}" if rnd.random() < 0.5 else f"{band}{cup} ({round(band * 2.54)}{cup})"
+    if kind < 0.95:
+        return ""
+    return rnd.choice(MALFORMED)
+
+def synthetic_performer(performer_id, rnd):
+    return {
+        "id": str(performer_id),
+        "name": f"Performer {performer_id}",
+        "measurements": random_measurements(rnd),
+        "height_cm": rnd.choice([None, rnd.randint(145, 190)]) if rnd.random() < 0.3 else rnd.randint(150, 185),
+        "weight": rnd.randint(40, 110) if rnd.random() < 0.6 else None,
+        "ethnicity": rnd.choice(ETHNICITIES),
+        "gender": "FEMALE" if rnd.random() < 0.8 else rnd.choice(["MALE", "TRANSGENDER_FEMALE", None]),
+        "tags": [],
+        "updated_at": "2020-01-01T00:00:00Z",
+    }
+
+def synthetic_performers(count, seed=0, start_id=1):
+    """yields count performers as stash would return them for PERFORMER_FRAGMENT, the same seed gives the same performers"""
+    rnd = random.Random(seed)
+    for performer_id in range(start_id, start_id + count):
+        yield synthetic_performer(performer_id, rnd)
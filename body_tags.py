@@ -1,6 +1,8 @@
 import operator
-from enum import Enum
+from bisect import bisect_left, bisect_right
+from enum import Enum, EnumMeta
 from dataclasses import dataclass, field
+from functools import lru_cache
 
 @dataclass
 class StashTagDC:
@@ -12,8 +14,7 @@ class StashTagDC:
     def tag_create_input(self, tag_name, alias_id):
         create_input = {"name": tag_name}
         create_input["description"] =  "[Managed By: PBC Plugin]\n"+self.description
-        self.aliases.append(alias_id)
-        create_input["aliases"] = self.aliases
+        create_input["aliases"] = self.aliases + [alias_id]
         if self.image:
             create_input["image"] = self.image
         return create_input
@@ -24,7 +25,69 @@ class StashTagEnum(Enum):
     def __str__(self) -> str:
         return f"{self.__class__.__name__}.{self.name}"
 
-class StashTagEnumComparable(StashTagEnum):
+class ThresholdIndex:
+    """precomputed StashTagEnumComparable.match_threshold() for every possible compare value
+
+    member thresholds stay the source of truth, the linear scan is evaluated once for each
+    breakpoint and for each interval between breakpoints so a match becomes a bisect.
+    operator.contains thresholds are flattened into a dict
+    """
+    def __init__(self, enum_class) -> None:
+        self.members = list(enum_class)
+
+        # value -> (member, position) for operator.contains thresholds, first member wins
+        self.lookup = {}
+        breakpoints = set()
+        for position, enum in enumerate(self.members):
+            if not enum.value.threshold:
+                continue
+            op, value = enum.value.threshold
+            if op == operator.contains:
+                for v in value:
+                    self.lookup.setdefault(v, (enum, position))
+            else:
+                breakpoints.add(value)
+        self.breakpoints = sorted(breakpoints)
+
+        # member positions, -1 when nothing matches
+        self.point_positions = [self.scan(b) for b in self.breakpoints]
+        self.interval_positions = [self.scan(v) for v in self.interval_values()]
+
+    def interval_values(self):
+        """one value from each interval around and between the breakpoints"""
+        if not self.breakpoints:
+            return [0]
+        values = [self.breakpoints[0] - 1]
+        values.extend((low + high) / 2 for low, high in zip(self.breakpoints, self.breakpoints[1:]))
+        values.append(self.breakpoints[-1] + 1)
+        return values
+
+    def scan(self, compare_value):
+        for position, enum in enumerate(self.members):
+            if enum.value.threshold and enum.value.threshold[0] != operator.contains and enum.within_threshold(compare_value):
+                return position
+        return -1
+
+    def match_position(self, compare_value):
+        if isinstance(compare_value, str):
+            match = self.lookup.get(compare_value)
+            return match[1] if match else -1
+        i = bisect_left(self.breakpoints, compare_value)
+        if i < len(self.breakpoints) and self.breakpoints[i] == compare_value:
+            return self.point_positions[i]
+        return self.interval_positions[i]
+
+    def match(self, compare_value):
+        position = self.match_position(compare_value)
+        return self.members[position] if position >= 0 else None
+
+class StashTagEnumComparableMeta(EnumMeta):
+    def __new__(metacls, cls, bases, classdict, **kwds):
+        enum_class = super().__new__(metacls, cls, bases, classdict, **kwds)
+        enum_class.threshold_index = ThresholdIndex(enum_class)
+        return enum_class
+
+class StashTagEnumComparable(StashTagEnum, metaclass=StashTagEnumComparableMeta):
     def __new__(cls, *args):
         obj = object.__new__(cls)
         obj._order_ = len(cls.__members__)
@@ -54,9 +117,7 @@ class StashTagEnumComparable(StashTagEnum):
 
     @classmethod
     def match_threshold(cls, compare_value):
-        for enum in cls:
-            if enum.within_threshold(compare_value):
-                return enum
+        return cls.threshold_index.match(compare_value)
 
 # body mass index determined from calculate_bmi()
 class BodyMassIndex(StashTagEnum):
@@ -154,8 +215,8 @@ class BodyType(StashTagEnumComparable):
     SSBBW   = StashTagDC(threshold=(operator.ge, 55))
 
 # https://ourworldindata.org/human-height
-# current implementation uses global average
-# TODO - can further segment by country/continent factor, see:
+# default rules use the global average, config.CLASSIFICATION_RULES["height"] can add tables by ethnicity
+# sources for regional tables:
 # https://www.worlddata.info/average-bodyheight.php
 # height means by ethnicity (US)
 # https://thebonescience.com/blogs/journal/average-height-around-the-world
@@ -164,7 +225,8 @@ class BodyType(StashTagEnumComparable):
 F_HEIGHT_MEAN = 164.7
 F_HEIGHT_SD = 7.07
 class HeightType(StashTagEnumComparable):
-    # threshold based off of performer.height_cm
+    # threshold based off of performer.height_cm, SHORT and TALL build the default height rule in DEFAULT_RULES,
+    # regional rules replace them and AVERAGE is set by DEFAULT_RULES["average_height"]
     SHORT   = StashTagDC(threshold=(operator.le, F_HEIGHT_MEAN - F_HEIGHT_SD))
     AVERAGE  = StashTagDC(threshold=(operator.le, F_HEIGHT_MEAN - F_HEIGHT_SD))
     TALL    = StashTagDC(threshold=(operator.ge, F_HEIGHT_MEAN + F_HEIGHT_SD))
@@ -187,113 +249,260 @@ class ButtSize(StashTagEnumComparable):
     HUGE    = StashTagDC(threshold=(operator.lt, 48))
     MASSIVE = StashTagDC(threshold=(operator.ge, 48))
 
+def default_height_rule():
+    """mean and sd placing the SHORT and TALL thresholds of HeightType at mean - sd and mean + sd"""
+    short = HeightType.SHORT.value.threshold[1]
+    tall = HeightType.TALL.value.threshold[1]
+    # rounded so float error does not show up in the rules table
+    return {"mean": round((short + tall) / 2, 6), "sd": round((tall - short) / 2, 6)}
+
+# Classification rules, config.CLASSIFICATION_RULES replaces any top level entry
+#  bmi: BodyMassIndex upper bounds by ethnicity, "default" applies to every ethnicity not listed
+#       https://www.ncbi.nlm.nih.gov/books/NBK541070/
+#  hip_size: HipSize for a waist to hip ratio above each bound, checked in order, None matches any ratio
+#  height: female height mean and standard deviation by ethnicity, "default" applies to every ethnicity not listed
+#          and is built from the HeightType thresholds
+#  average_height: heights strictly between these are always HeightType.AVERAGE
+#  shapes: a BodyShape matches when every clause of any one of its alternatives holds,
+#          clauses compare bust_hips, bust_waist, hips_bust, hips_waist or hips_over_waist to a value
+#  Shape Calculation References:
+#   https://en.wikipedia.org/wiki/Female_body_shape#FFIT_for_Apparel_measurements
+#   https://scholarsbank.uoregon.edu/xmlui/bitstream/handle/1794/25863/2022sokolowski.pdf?sequence=1&isAllowed=y
+DEFAULT_RULES = {
+    "bmi": {
+        "default": [16.5, 18.5, 25, 30, 35, 40],
+        "Asian":   [16.5, 18.5, 23, 25, 30, 35],
+    },
+    "hip_size": [
+        ["WIDE", 0.8],
+        ["MEDIUM", 0.64],
+        ["SLIM", None],
+    ],
+    "height": {
+        "default": default_height_rule(),
+    },
+    "average_height": [160, 180],
+    "shapes": {
+        # bust to waist ratio close to 1 with a small waist
+        "HOURGLASS": [
+            [["bust_hips", "<=", 1], ["hips_bust", "<", 3.6], ["bust_waist", ">=", 9]],
+            [["bust_hips", "<=", 1], ["hips_bust", "<", 3.6], ["hips_waist", ">=", 10]],
+        ],
+        # hourglass with more defined waist
+        "BOTTOM_HOURGLASS": [
+            [["hips_bust", ">=", 3.6], ["hips_bust", "<", 10], ["hips_waist", ">=", 9], ["hips_over_waist", "<", 1.193]],
+        ],
+        # hourglass with more defined bust
+        "TOP_HOURGLASS": [
+            [["bust_hips", ">", 1], ["bust_hips", "<", 10], ["bust_waist", ">=", 9]],
+        ],
+        # hips greater than bust, triangle with smaller waist
+        "SPOON": [
+            [["hips_bust", ">", 2], ["hips_waist", ">=", 7], ["hips_over_waist", ">", 1.193]],
+        ],
+        # small bust large hips with larger/tapered waist
+        "TRIANGLE": [
+            [["hips_bust", ">=", 3.6], ["hips_waist", ">=", 0], ["hips_waist", "<", 9]],
+            [["bust_waist", "<", 0], ["hips_waist", ">=", 0]],
+        ],
+        "INVERTED_TRIANGLE": [
+            [["bust_hips", ">=", 3.6], ["bust_waist", "<", 9]],
+        ],
+        "RECTANGLE": [
+            [["hips_bust", "<", 3.6], ["bust_hips", "<", 3.6], ["bust_waist", ">=", 0], ["bust_waist", "<", 9], ["hips_waist", ">=", 0], ["hips_waist", "<", 10]],
+        ],
+        "DIAMOND": [
+            [["hips_waist", "<", 0], ["bust_waist", "<", 0]],
+        ],
+        "OVAL": [
+            [["hips_waist", "<", 0], ["bust_waist", ">=", 0]],
+        ],
+    },
+}
+
+RULE_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+def shape_terms(bust, waist, hips):
+    """measurement differences and ratios the shape rules compare, works on floats and numpy arrays"""
+    return {
+        "bust_hips": bust - hips,
+        "bust_waist": bust - waist,
+        "hips_bust": hips - bust,
+        "hips_waist": hips - waist,
+        "hips_over_waist": hips / waist,
+    }
+
+SHAPE_TERMS = tuple(shape_terms(1.0, 1.0, 1.0))
+
+class ClassificationRuleError(Exception):
+    pass
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def rule_errors(table):
+    """every problem found in a rules table, an empty list when it can be compiled"""
+    errors = [f"unknown entry '{key}'" for key in table if key not in DEFAULT_RULES]
+    for name, default in DEFAULT_RULES.items():
+        if not isinstance(table[name], type(default)):
+            errors.append(f"{name} needs to be a {type(default).__name__}")
+    if errors:
+        return errors
+
+    for name in ("bmi", "height"):
+        if "Default" not in [ethnicity.title() for ethnicity in table[name]]:
+            errors.append(f"{name} has no 'default' entry")
+    for ethnicity, breakpoints in table["bmi"].items():
+        if len(breakpoints) != len(BodyMassIndex) - 1 or not all(is_number(b) for b in breakpoints):
+            errors.append(f"bmi '{ethnicity}' needs {len(BodyMassIndex) - 1} numeric breakpoints")
+    for ethnicity, height in table["height"].items():
+        if not isinstance(height, dict) or not is_number(height.get("mean")) or not is_number(height.get("sd")):
+            errors.append(f"height '{ethnicity}' needs a numeric mean and sd")
+
+    for entry in table["hip_size"]:
+        if len(entry) != 2 or entry[0] not in HipSize.__members__ or not (entry[1] is None or is_number(entry[1])):
+            errors.append(f"hip_size {entry} needs a HipSize name and a numeric bound or None")
+    if len(table["average_height"]) != 2 or not all(is_number(h) for h in table["average_height"]):
+        errors.append("average_height needs two numeric heights")
+
+    for name, alternatives in table["shapes"].items():
+        if name not in BodyShape.__members__:
+            errors.append(f"shapes has unknown BodyShape '{name}'")
+            continue
+        for alternative in alternatives:
+            for clause in alternative:
+                if len(clause) != 3 or clause[0] not in SHAPE_TERMS or clause[1] not in RULE_OPERATORS or not is_number(clause[2]):
+                    errors.append(f"shapes {name} clause {clause} needs one of {', '.join(SHAPE_TERMS)}, "
+                                  f"one of {' '.join(RULE_OPERATORS)} and a number")
+    return errors
+
+class ClassificationRules:
+    """DEFAULT_RULES with overrides compiled once for the scalar and batch classifiers
+
+    breakpoints are sorted lists ready for bisect/searchsorted and every distinct shape
+    clause is evaluated once per performer no matter how many shapes share it
+    """
+    def __init__(self, overrides=None) -> None:
+        self.load(overrides)
+
+    def load(self, overrides=None):
+        table = {**DEFAULT_RULES, **(overrides or {})}
+        if errors := rule_errors(table):
+            raise ClassificationRuleError("invalid CLASSIFICATION_RULES: " + "; ".join(errors))
+        self.table = table
+
+        self.bmi_breakpoints = {ethnicity.title(): sorted(breakpoints) for ethnicity, breakpoints in self.table["bmi"].items()}
+        self.bmi_members = list(BodyMassIndex)
+
+        self.hip_sizes = [(HipSize[name], bound) for name, bound in self.table["hip_size"]]
+
+        self.height_limits = {
+            ethnicity.title(): (h["mean"] - h["sd"], h["mean"] + h["sd"]) for ethnicity, h in self.table["height"].items()
+        }
+        self.average_height = tuple(self.table["average_height"])
+
+        self.clauses = []
+        self.shapes = []
+        clause_positions = {}
+        for body_shape in BodyShape:
+            alternatives = []
+            for alternative in self.table["shapes"].get(body_shape.name, []):
+                positions = []
+                for term, op, value in alternative:
+                    clause = (term, op, value)
+                    if clause not in clause_positions:
+                        clause_positions[clause] = len(self.clauses)
+                        self.clauses.append((term, RULE_OPERATORS[op], value))
+                    positions.append(clause_positions[clause])
+                alternatives.append(positions)
+            if alternatives:
+                self.shapes.append((body_shape, alternatives))
+
+    def bmi_breakpoints_for(self, ethnicity):
+        return self.bmi_breakpoints.get(ethnicity, self.bmi_breakpoints["Default"])
+
+    def height_limits_for(self, ethnicity):
+        """(short, tall) height thresholds in cm"""
+        return self.height_limits.get(ethnicity, self.height_limits["Default"])
+
+    def bmi_class(self, bmi, ethnicity):
+        return self.bmi_members[bisect_right(self.bmi_breakpoints_for(ethnicity), bmi)]
+
+    def hip_size(self, waist, hips):
+        whr = waist / hips
+        for hip_size, bound in self.hip_sizes:
+            if bound is None or whr > bound:
+                return hip_size
+        return None
+
+    def is_short(self, height_cm, ethnicity):
+        return height_cm <= self.height_limits_for(ethnicity)[0]
+
+    def height_type(self, height_cm, ethnicity):
+        low, high = self.average_height
+        if low < height_cm < high:
+            return HeightType.AVERAGE
+        short, tall = self.height_limits_for(ethnicity)
+        if height_cm <= short:
+            return HeightType.SHORT
+        if height_cm >= tall:
+            return HeightType.TALL
+        return None
+
+    def evaluate_clauses(self, bust, waist, hips):
+        terms = shape_terms(bust, waist, hips)
+        return [op(terms[term], value) for term, op, value in self.clauses]
+
+    def match_shapes(self, bust, waist, hips):
+        results = self.evaluate_clauses(bust, waist, hips)
+        return [
+            body_shape for body_shape, alternatives in self.shapes
+            if any(all(results[i] for i in alternative) for alternative in alternatives)
+        ]
+
+    def shape_masks(self, bust, waist, hips, valid):
+        """match_shapes() for numpy columns, returns a mask of matching rows for each BodyShape"""
+        results = self.evaluate_clauses(bust, waist, hips)
+        masks = {body_shape: valid & False for body_shape in BodyShape}
+        for body_shape, alternatives in self.shapes:
+            for alternative in alternatives:
+                mask = valid
+                for i in alternative:
+                    mask = mask & results[i]
+                masks[body_shape] = masks[body_shape] | mask
+        return masks
+
+# replaced in place by load_rules() so every module sees the rules from config
+RULES = ClassificationRules()
+
+def load_rules(overrides=None):
+    RULES.load(overrides)
+    # cached tag sets were classified under the previous rules
+    clear_classification_cache()
+    return RULES
+
 def calculate_hip_size(performer):
     if not performer.waist or not performer.hips:
         return None
+    return RULES.hip_size(performer.waist, performer.hips)
 
-    whr = performer.waist / performer.hips
-
-    if whr > 0.8:
-        return HipSize.WIDE
-    elif whr > 0.64:
-        return HipSize.MEDIUM
-    else:
-        return HipSize.SLIM
-         
-# https://www.ncbi.nlm.nih.gov/books/NBK541070/
 def calculate_bmi(performer):
     if performer.bmi < 1:
         return None
-    elif performer.ethnicity.title() == 'Asian':
-        if performer.bmi < 16.5:
-            return BodyMassIndex.SEVERELY_UNDERWEIGHT
-        elif performer.bmi < 18.5:
-            return BodyMassIndex.UNDERWEIGHT
-        elif performer.bmi < 23:
-            return BodyMassIndex.HEALTHY
-        elif performer.bmi < 25:
-            return BodyMassIndex.OVERWEIGHT
-        elif performer.bmi < 30:
-            return BodyMassIndex.OBESE_CLASS_1
-        elif performer.bmi < 35:
-            return BodyMassIndex.OBESE_CLASS_2
-        else:
-            return BodyMassIndex.SEVERELY_OBESE
-    else:
-        if performer.bmi < 16.5:
-            return BodyMassIndex.SEVERELY_UNDERWEIGHT
-        elif performer.bmi < 18.5:
-            return BodyMassIndex.UNDERWEIGHT
-        elif performer.bmi < 25:
-            return BodyMassIndex.HEALTHY
-        elif performer.bmi < 30:
-            return BodyMassIndex.OVERWEIGHT
-        elif performer.bmi < 35:
-            return BodyMassIndex.OBESE_CLASS_1
-        elif performer.bmi < 40:
-            return BodyMassIndex.OBESE_CLASS_2
-        else:
-            return BodyMassIndex.SEVERELY_OBESE
-
-
-# Shape Calculation References:
-#  https://en.wikipedia.org/wiki/Female_body_shape#FFIT_for_Apparel_measurements
-#  https://scholarsbank.uoregon.edu/xmlui/bitstream/handle/1794/25863/2022sokolowski.pdf?sequence=1&isAllowed=y
-def calculate_shape(performer):
+    # a missing ethnicity uses the default rules
+    return RULES.bmi_class(performer.bmi, (performer.ethnicity or "").title())
 
-    shapes = []
+def calculate_shape(performer):
     if not performer.bust or not performer.waist or not performer.hips:
-        return shapes
-
-    bust_hips = performer.bust - performer.hips
-    bust_waist = performer.bust - performer.waist
-    hips_bust = performer.hips - performer.bust
-    hips_waist = performer.hips - performer.waist
-    
-    hips_over_waist = performer.hips/performer.waist # highip/waist
-
-    # bust to waist ratio close to 1 with a small waist
-    if bust_hips <= 1 and hips_bust < 3.6 and (9 <= bust_waist or 10 <= hips_waist):
-        shapes.append(BodyShape.HOURGLASS)
-
-    # If (hip-bust) ≥ 3.6 and (hip-bust) < 10, then if (hip-waist) ≥ 9, then if (high hip/waist) < 1.193 
-    # hourglass with more defined waist
-    if 3.6 <= hips_bust and hips_bust < 10 and 9 <= hips_waist and hips_over_waist < 1.193:
-        shapes.append(BodyShape.BOTTOM_HOURGLASS)
-
-    # hourglass with more defined bust
-    if 1 < bust_hips and bust_hips < 10 and 9 <= bust_waist:
-        shapes.append(BodyShape.TOP_HOURGLASS)
-
-    # spoon: hips greater than bust, triangle with smaller waist
-    if 2 < hips_bust and 7 <= hips_waist and 1.193 < hips_over_waist:
-        shapes.append(BodyShape.SPOON)
-    
-    # triangle small bust large hips with larger/tapered waist
-    if 3.6 <= hips_bust and 0 <= hips_waist < 9 or bust_waist < 0 and 0 <= hips_waist:
-        shapes.append(BodyShape.TRIANGLE)
-
-    if 3.6 <= bust_hips and bust_waist < 9:
-        shapes.append(BodyShape.INVERTED_TRIANGLE)
-
-    if hips_bust < 3.6 and bust_hips < 3.6 and 0 <= bust_waist < 9 and 0 <= hips_waist < 10:
-        shapes.append(BodyShape.RECTANGLE)
-    
-    if hips_waist < 0 and bust_waist < 0:
-        shapes.append(BodyShape.DIAMOND)
-    
-    if hips_waist < 0 and 0 <= bust_waist:
-        shapes.append(BodyShape.OVAL)
-
-    return shapes
+        return []
+    return RULES.match_shapes(performer.bust, performer.waist, performer.hips)
 
 # SEE: https://en.wikipedia.org/wiki/Bra_size#The_meaning_of_cup_sizes_varies
 # "cup size approximates the difference between the Over-the-bust and band measurements in inches"
 # index == bust band difference in inches
 def get_bust_band_difference(cupsize):
-    for difference, cup_enum in enumerate(BreastCup):
-        if cup_enum.within_threshold(cupsize):
-            return difference    
+    if match := BreastCup.threshold_index.lookup.get(cupsize):
+        return match[1]
     raise Exception(f"could not identify cupsize '{cupsize}' add to 'BreastCup' enum")
 
 # Approximates breasts weight in kg, derived from this chart https://i.imgur.com/QZBhze8.png
@@ -305,12 +514,92 @@ def approximate_breast_weight(bust_band_diff):
     weight_lb = 0.765 + 0.415 * bust_band_diff + -0.0168 * bust_band_diff ** 2 + 0.00247 * bust_band_diff ** 3
     return weight_lb * 0.453
 
+# every enum managed as stash tags, new tag enums must be added here
+TAG_CLASSES = (
+    BodyMassIndex,
+    BodyShape,
+    BodyType,
+    BreastCup,
+    BreastSize,
+    ButtSize,
+    HeightType,
+    HipSize,
+)
+
 def get_tag_classes():
-    import sys, inspect
-    tag_classes = []
-    for _, cls in inspect.getmembers(sys.modules[__name__], inspect.isclass):
-        if cls in [StashTagEnum, StashTagEnumComparable]:
-            continue
-        if issubclass(cls, StashTagEnum):
-            tag_classes.append(cls)
-    return tag_classes
\ No newline at end of file
+    return list(TAG_CLASSES)
+
+# every tag enum member gets a bit so a performers tags fit in a single int
+TAG_MEMBERS = [enum for enum_class in get_tag_classes() for enum in enum_class]
+TAG_BITS = {enum: 1 << i for i, enum in enumerate(TAG_MEMBERS)}
+
+def tags_from_bits(tag_bits):
+    tags = []
+    while tag_bits:
+        low_bit = tag_bits & -tag_bits
+        tags.append(TAG_MEMBERS[low_bit.bit_length() - 1])
+        tag_bits ^= low_bit
+    return tags
+
+CURVY_SHAPE_BITS = sum(TAG_BITS[body_shape] for body_shape in CURVY_SHAPES)
+SHAPE_BITS = sum(TAG_BITS[body_shape] for body_shape in BodyShape)
+
+def _classify_measurements(cupsize, bust, waist, hips, breast_volume, height_cm, bmi, ethnicity, female):
+    """tag bits for a set of parsed measurements, see classify_measurements()"""
+    tag_bits = 0
+    if bmi >= 1:
+        tag_bits |= TAG_BITS[RULES.bmi_class(bmi, ethnicity)]
+    if breast_volume and (breast_size := BreastSize.match_threshold(breast_volume)):
+        tag_bits |= TAG_BITS[breast_size]
+    if cupsize and (breast_cup := BreastCup.match_threshold(cupsize)):
+        tag_bits |= TAG_BITS[breast_cup]
+    if waist and hips and (hip_size := RULES.hip_size(waist, hips)):
+        tag_bits |= TAG_BITS[hip_size]
+    if hips and (butt_size := ButtSize.match_threshold(hips)):
+        tag_bits |= TAG_BITS[butt_size]
+    # only tuned on female heights
+    if height_cm and female and (height_type := RULES.height_type(height_cm, ethnicity)):
+        tag_bits |= TAG_BITS[height_type]
+    if bust and waist and hips:
+        for body_shape in RULES.match_shapes(bust, waist, hips):
+            tag_bits |= TAG_BITS[body_shape]
+    if bmi and (descriptor := BodyType.match_threshold(bmi)):
+        if descriptor == BodyType.FIT and RULES.is_short(height_cm, ethnicity):
+            descriptor = BodyType.PETITE
+        if descriptor == BodyType.AVERAGE and tag_bits & CURVY_SHAPE_BITS:
+            descriptor = BodyType.CURVY
+        tag_bits |= TAG_BITS[descriptor]
+    return tag_bits
+
+_classification_cache = lru_cache(maxsize=4096)(_classify_measurements)
+
+def set_classification_cache_size(maxsize):
+    """replaces the classify_measurements() cache with an empty one holding up to maxsize tag sets"""
+    global _classification_cache
+    _classification_cache = lru_cache(maxsize=maxsize)(_classify_measurements)
+
+def classify_measurements(cupsize, bust, waist, hips, breast_volume, height_cm, bmi, ethnicity, female):
+    """tag bits for a set of parsed measurements
+
+    cached on the whole measurement tuple as many performers share the same measurements,
+    ethnicity is the title cased region used to pick regional rules
+    """
+    return _classification_cache(cupsize, bust, waist, hips, breast_volume, height_cm, bmi, ethnicity, female)
+
+def clear_classification_cache():
+    _classification_cache.cache_clear()
+
+def cache_stats(cached_function):
+    """hit/miss counters of an lru_cache wrapped function"""
+    info = cached_function.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_rate": info.hits / lookups if lookups else 0.0,
+    }
+
+def classification_cache_stats():
+    """hit/miss counters of the classify_measurements() cache"""
+    return cache_stats(_classification_cache)
@@ -14,4 +14,68 @@ TAGS_TO_USE = (
     HeightType,
     HipSize,
     BodyMassIndex
-)
\ No newline at end of file
+)
+
+# Number of performers fetched from Stash per request, -1 fetches all performers in a single request
+PERFORMER_PAGE_SIZE = 1000
+
+# Only fetch FEMALE performers with measurements or a height from Stash, False fetches every performer
+FILTER_PERFORMERS_IN_STASH = True
+
+# Engine used to classify performers
+#  "scalar" classifies one performer at a time
+#  "numpy" classifies each page of performers at once, requires numpy (pip install numpy)
+CLASSIFIER_ENGINE = "scalar"
+
+# Number of distinct measurement strings kept in the parse cache
+MEASUREMENT_CACHE_SIZE = 4096
+# Number of distinct measurement combinations whose tags are kept by the scalar engine
+CLASSIFICATION_CACHE_SIZE = 4096
+
+# Shard each page of performers across worker processes while classifying
+# larger PERFORMER_PAGE_SIZE values give each worker more to do per page
+PARALLEL_CLASSIFY = False
+# Number of worker processes, None uses the number of CPUs
+CLASSIFIER_WORKERS = None
+
+# Performer ids sent per bulk tag update request
+WRITE_CHUNK_SIZE = 500
+# Number of bulk tag update requests sent to Stash at the same time
+WRITE_CONCURRENCY = 4
+# Number of times a failed bulk tag update request is retried
+WRITE_RETRIES = 3
+
+# Send tag updates while performers are still being fetched instead of after the last page,
+# on a slow connection a run then takes about as long as the slower of fetching and writing.
+# Pipelined runs are not checkpointed, an interrupted run is simply started again
+PIPELINE_WRITES = False
+# Number of performer pages fetched ahead of classification while pipelining
+PIPELINE_WINDOW = 2
+
+# Profile classification with cProfile, the profile is saved to pbc_profile.prof next to the plugin
+# a summary of every run is always saved to pbc_run_stats.json
+PROFILE_CLASSIFY = False
+
+# Number of tags deleted per request by 'Destroy Managed Tags'
+DESTROY_CHUNK_SIZE = 10
+# Remove managed tags from performers in bulk before deleting them
+DETACH_TAGS_BEFORE_DESTROY = False
+
+# Save the parsed measurements of every performer to pbc_snapshot.json and one file per column on full runs, requires numpy
+# 'Reclassify (Snapshot)' retags from it after changing thresholds without fetching every performer again
+SAVE_SNAPSHOT = False
+
+# Override classification rules, see DEFAULT_RULES in body_tags.py for every entry and its format
+# each top level entry given here replaces the default one, rules that do not fit that format stop the plugin
+# with an error listing every problem. e.g. regional height tables keyed by ethnicity:
+# CLASSIFICATION_RULES = {
+#     "height": {
+#         "default": {"mean": F_HEIGHT_MEAN, "sd": F_HEIGHT_SD},
+#         "Asian": {"mean": <mean cm>, "sd": <standard deviation cm>},
+#     },
+# }
+CLASSIFICATION_RULES = {}
+
+# Save the tag changes of a run to pbc_checkpoint.jsonl before writing them and journal every written chunk,
+# a run that is interrupted resumes its remaining writes the next time it is started instead of starting over
+CHECKPOINT_WRITES = True
@@ -0,0 +1,76 @@
+import os
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from performer_calculator import *
+
+import stashapi.log as log
+
+LOG_LEVELS = ("trace", "debug", "info", "warning", "error")
+
+def classify_shard(performers, keep_records=False):
+    """runs classify_performers() in a worker, log calls, parse counts and parsed records are returned with the result"""
+    log_records = []
+    log_functions = {level: getattr(log, level) for level in LOG_LEVELS if hasattr(log, level)}
+    for level in log_functions:
+        setattr(log, level, lambda s, level=level: log_records.append((level, s)))
+    reset_parse_counts()
+    records = [] if keep_records else None
+    try:
+        tag_updates = classify_performers(performers, records)
+    finally:
+        for level, log_function in log_functions.items():
+            setattr(log, level, log_function)
+    return dict(tag_updates), log_records, (dict(PARSE_COUNTS), dict(PARSE_FAILURES)), records
+
+class ShardedClassifier:
+    """splits each page of performers into one shard per worker process
+
+    shard results are merged and their buffered logs replayed in shard order, so ids
+    and log output come out in the same order as classify_performers() would give
+    """
+    def __init__(self, workers) -> None:
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    def __call__(self, performers, records=None):
+        shard_size = -(-len(performers) // self.workers)
+        shards = [performers[i:i + shard_size] for i in range(0, len(performers), shard_size)]
+        futures = [self.pool.submit(classify_shard, shard, records is not None) for shard in shards]
+
+        tag_updates = defaultdict(list)
+        for future in futures:
+            shard_updates, log_records, (parse_counts, parse_failures), shard_records = future.result()
+            if records is not None:
+                records.extend(shard_records)
+            for level, s in log_records:
+                getattr(log, level)(s)
+            PARSE_COUNTS.update(parse_counts)
+            PARSE_FAILURES.update(parse_failures)
+            for enum, performer_ids in shard_updates.items():
+                tag_updates[enum].extend(performer_ids)
+        return tag_updates
+
+    def close(self):
+        self.pool.shutdown()
+
+def classifier_workers():
+    return getattr(config, "CLASSIFIER_WORKERS", None) or os.cpu_count() or 1
+
+@contextmanager
+def performer_classifier():
+    """yields a function returning the tag updates for a page of performers
+
+    pages are sharded across a process pool when config.PARALLEL_CLASSIFY is set
+    """
+    workers = classifier_workers()
+    if not getattr(config, "PARALLEL_CLASSIFY", False) or workers < 2:
+        yield classify_performers
+        return
+    log.debug(f"Classifying performers with {workers} worker processes")
+    classifier = ShardedClassifier(workers)
+    try:
+        yield classifier
+    finally:
+        classifier.close()
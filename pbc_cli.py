@@ -0,0 +1,70 @@
+"""classify performers from a JSON Lines or CSV export without a stash connection
+
+    python pbc_cli.py performers.jsonl -o tags.jsonl
+    python pbc_cli.py performers.csv -o tags.csv
+    cat performers.jsonl | python pbc_cli.py - --input-format jsonl > tags.jsonl
+
+input rows need id, measurements, height_cm, weight, ethnicity and gender, name is optional.
+rows are read, classified and written one at a time so memory does not grow with the input
+"""
+import sys, csv, json, argparse
+
+import config
+from performer_calculator import *
+
+PERFORMER_FIELDS = ("id", "name", "measurements", "height_cm", "weight", "ethnicity", "gender")
+
+def read_performers(f, input_format):
+    rows = csv.DictReader(f) if input_format == "csv" else (json.loads(line) for line in f if line.strip())
+    for row in rows:
+        performer = {field: row.get(field) for field in PERFORMER_FIELDS}
+        performer["id"] = str(performer["id"])
+        performer["name"] = performer["name"] or performer["id"]
+        performer["measurements"] = performer["measurements"] or ""
+        # a missing ethnicity uses the default rules, as it does in the plugin
+        performer["ethnicity"] = performer["ethnicity"] or ""
+        yield performer
+
+def classify_stream(performers):
+    """yields (performer id, tag names) for every performer that could be classified"""
+    for p in parse_performers(performers):
+        tags = [str(tag_enum) for tag_enum in tags_from_bits(p.tag_bits) if isinstance(tag_enum, config.TAGS_TO_USE)]
+        yield p.id, tags
+
+def write_results(results, f, output_format):
+    if output_format == "csv":
+        writer = csv.writer(f)
+        writer.writerow(["id", "tags"])
+        for performer_id, tags in results:
+            writer.writerow([performer_id, ";".join(tags)])
+    else:
+        for performer_id, tags in results:
+            f.write(json.dumps({"id": performer_id, "tags": tags}))
+            f.write("\n")
+
+def guess_format(path, default="jsonl"):
+    return "csv" if path.lower().endswith(".csv") else default
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify performers from a JSON Lines or CSV file")
+    parser.add_argument("input", help="input file, - reads stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, - writes stdout (default)")
+    parser.add_argument("--input-format", choices=("jsonl", "csv"), help="defaults to the input file extension")
+    parser.add_argument("--output-format", choices=("jsonl", "csv"), help="defaults to the output file extension")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or guess_format(args.input)
+    output_format = args.output_format or guess_format(args.output)
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8", newline="")
+    dst = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        write_results(classify_stream(read_performers(src, input_format)), dst, output_format)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,107 +1,578 @@
-import sys, json
+import os, sys, json, time
 from collections import defaultdict 
+from contextlib import nullcontext
 
 import config
 from performer_calculator import *
 from body_tags import *
+from plugin_state import *
+from run_stats import RunStats
 
 try:
     import stashapi.log as log
     log.LEVEL = config.log_level
-    from stashapi.stashapp import StashInterface
-    from stashapi.stash_types import OnMultipleMatch
 except ModuleNotFoundError:
     print("You need to install stashapp-tools. (https://pypi.org/project/stashapp-tools/)", file=sys.stderr)
     print("If you have pip (normally installed with python), run this command in a terminal (cmd): 'pip install stashapp-tools'", file=sys.stderr)
     sys.exit()
 
-def main(stash_in=None, mode_in=None):
-    global stash
+def main(stash_in=None, mode_in=None, hook_context_in=None):
+    global stash, stats
 
     if stash_in:
         stash = stash_in
         mode = mode_in
+        hook_context = hook_context_in
     else:
+        # deferred so tasks run against a provided stash never load the GraphQL client
+        from stashapi.stashapp import StashInterface
         fragment = json.loads(sys.stdin.read())
         stash = StashInterface(fragment["server_connection"])
-        mode = fragment['args']['mode']
+        hook_context = fragment['args'].get('hookContext')
+        mode = fragment['args'].get('mode') or ("hook" if hook_context else None)
+
+    if mode == "hook":
+        # hooks run on every performer edit, they are kept out of the run statistics
+        run_hook(hook_context or {})
+        return
+
+    stats = RunStats(mode)
+    stats.instrument(stash)
+    if getattr(config, "PROFILE_CLASSIFY", False):
+        stats.enable_profiler()
+    reset_parse_counts()
 
     if mode == "run_calculator":
         run_calculator()
+    if mode == "run_calculator_incremental":
+        run_calculator(incremental=True)
+    if mode == "dry_run":
+        run_calculator(dry_run=True)
+    if mode == "apply_plan":
+        apply_plan()
+    if mode == "reclassify_snapshot":
+        reclassify_snapshot()
+    if mode == "report":
+        run_report()
     if mode == "destroy_managed_tags":
         destroy_managed_tags()
 
+    stats.finish()
+    stats.log_summary()
+    stats.save(RUN_STATS_FILE, PROFILE_FILE)
+
+MANAGED_TAG_FILTER = {"description":{"value": "^\\[Managed By: PBC Plugin\\]","modifier": "MATCHES_REGEX"}}
+
 def destroy_managed_tags():
-    tags = stash.find_tags(f={"description":{"value": "^\\[Managed By: PBC Plugin\\]","modifier": "MATCHES_REGEX"}}, fragment="id")
-    log.info(f"Deleting {len(tags)} tags...")
-    stash.destroy_tags([t["id"] for t in tags])
+    """deletes every plugin managed tag in chunks of config.DESTROY_CHUNK_SIZE
+
+    with config.DETACH_TAGS_BEFORE_DESTROY the tags are first removed from performers
+    with bulk updates so stash has less to cascade when each tag is deleted
+    """
+    from tag_writer import TagWriter, chunked
+
+    tag_ids = [t["id"] for t in stash.find_tags(f=MANAGED_TAG_FILTER, fragment="id")]
+    # cached ids would point at deleted tags, and the watermark at performers that held them
+    remove_file(TAG_CACHE_FILE)
+    remove_file(STATE_FILE)
+    if not tag_ids:
+        log.info("No managed tags found")
+        return
+
+    if getattr(config, "DETACH_TAGS_BEFORE_DESTROY", False):
+        with stats.stage("detach"):
+            # collect every id first, detaching while paging would shift the pages of the filter
+            performer_ids = [p["id"] for performers in iter_performer_pages(f=managed_tags_filter(tag_ids), fragment="id") for p in performers]
+            log.info(f"Removing managed tags from {len(performer_ids)} performer(s)...")
+            with TagWriter(stash) as writer:
+                writer.update_ids(performer_ids, tag_ids, "REMOVE")
+            stats.counters["detached"] += len(performer_ids)
+
+    log.info(f"Deleting {len(tag_ids)} tags...")
+    with stats.stage("destroy"):
+        chunks = list(chunked(tag_ids, getattr(config, "DESTROY_CHUNK_SIZE", 10)))
+        for i, chunk in enumerate(chunks):
+            destroy_tags(chunk)
+            stats.counters["destroyed"] += len(chunk)
+            log.progress((i + 1) / len(chunks))
+
+def destroy_tags(tag_ids):
+    """deletes tag_ids, a rejected request is split in half and retried down to single tags"""
+    try:
+        stash.destroy_tags(tag_ids)
+    except Exception as e:
+        if len(tag_ids) == 1:
+            raise
+        log.warning(f"Deleting {len(tag_ids)} tags failed, retrying in smaller requests: {e}")
+        middle = len(tag_ids) // 2
+        destroy_tags(tag_ids[:middle])
+        destroy_tags(tag_ids[middle:])
+
+# performer fields the classification reads, edits to other fields cannot change any tag
+CLASSIFIED_FIELDS = {"measurements", "height_cm", "weight", "ethnicity", "gender"}
+
+def run_hook(hook_context):
+    """recalculates the tags of the performer a Performer.Create.Post/Update.Post hook fired for
+
+    takes one fetch and at most one update, tag ids are read from TAG_CACHE_FILE when it is complete
+    """
+    performer_id = hook_context.get("id")
+    input_fields = set(hook_context.get("inputFields") or [])
+    if not performer_id:
+        return
+    # updates that only touch tags include the ones this hook sends, skipping them avoids a loop
+    if input_fields and not input_fields & CLASSIFIED_FIELDS:
+        log.debug(f"Performer {performer_id} update does not change measurements, skipping")
+        return
+
+    performer = stash.find_performer(performer_id, fragment=PERFORMER_FRAGMENT)
+    if not performer:
+        log.warning(f"Performer {performer_id} not found")
+        return
+
+    tag_enums = get_tag_enums()
+    init_tag_ids(validate=False)
+    managed_tag_ids = {enum.tag_id for enum in tag_enums if enum.tag_id}
+
+    matched = set()
+    for p in parse_performers([performer]):
+        # members of classes left out of TAGS_TO_USE never get a tag_id
+        matched.update(
+            enum.tag_id for enum in tags_from_bits(p.tag_bits)
+            if isinstance(enum, config.TAGS_TO_USE) and enum.tag_id in managed_tag_ids
+        )
+
+    current_tag_ids = [tag["id"] for tag in performer.get("tags", [])]
+    tag_ids = [tag_id for tag_id in current_tag_ids if tag_id not in managed_tag_ids] + sorted(matched)
+    if set(tag_ids) == set(current_tag_ids):
+        log.debug(f"Performer {performer_id} tags are up to date")
+        return
+
+    log.info(f"Updating tags of performer {performer_id}")
+    stash.update_performer({"id": performer_id, "tag_ids": tag_ids})
+
+def run_calculator(incremental=False, dry_run=False):
+    """tags performers based on their measurements
+
+    with dry_run nothing is written to stash, the tag changes are saved to PLAN_FILE instead
+    """
+    import parallel_classifier
+    from tag_writer import TagWriter, PlanWriter
 
-def run_calculator():
+    # pipelined writes are sent while later pages are fetched, they are not checkpointed first
+    pipeline = getattr(config, "PIPELINE_WRITES", False) and not dry_run
+    checkpoint = getattr(config, "CHECKPOINT_WRITES", True) and not dry_run and not pipeline
+    if checkpoint and resume_checkpoint():
+        return
 
-    all_tag_ids = []
-    tag_updates = defaultdict(list)
+    tag_adds = defaultdict(list)
+    tag_removes = defaultdict(list)
 
+    # performers written by this run get a newer updated_at and are rechecked next time,
+    # their diff is empty so they cost a fetch but no writes
+    run_started = utc_timestamp()
+    fingerprint = config_fingerprint(config.TAGS_TO_USE)
     log.info("Finding Tags in Stash...")
-    for enum_class in get_tag_classes():
-        enumtag_stash_init(enum_class, all_tag_ids)
-
-    # get performers with measurements
-    performers = stash.find_performers(fragment=PERFORMER_FRAGMENT)
-    
-    log.info("Removing existing plugin tags...")
-    stash.update_performers({
-        "ids": [p["id"] for p in performers],
-        "tag_ids":{
-            "ids": all_tag_ids,
-            "mode": "REMOVE"
-        }
-    })
+    with stats.stage("tag_init"):
+        tag_enums = get_tag_enums()
+        all_tag_ids = init_tag_ids(create=not dry_run)
+
+    updated_filter = {}
+    if incremental:
+        state = load_json(STATE_FILE, {})
+        if state.get("fingerprint") != fingerprint:
+            log.info("Tag rules changed since last run, recalculating all performers...")
+        elif state.get("tag_ids") != managed_tag_ids():
+            # recreated tags start empty and deleting a tag does not touch updated_at of its performers
+            log.info("Managed tags changed since last run, recalculating all performers...")
+        elif state.get("watermark"):
+            log.info(f"Only checking performers updated since {state['watermark']}")
+            updated_filter = {"updated_at": {"value": state["watermark"], "modifier": "GREATER_THAN"}}
+
+    # a snapshot has to cover every performer, incremental runs only see the updated ones
+    snapshot = None
+    if getattr(config, "SAVE_SNAPSHOT", False) and not updated_filter:
+        import batch_classifier
+        if batch_classifier.np is None:
+            log.warning("SAVE_SNAPSHOT requires numpy (pip install numpy), no snapshot is saved")
+        else:
+            snapshot = batch_classifier.SnapshotWriter(SNAPSHOT_FILE)
+
+    if dry_run:
+        writer = PlanWriter(PLAN_FILE, fingerprint, journal_path=PLAN_JOURNAL_FILE)
+    elif checkpoint:
+        # every change is journaled before it is written so an interrupted run can resume its writes
+        writer = PlanWriter(CHECKPOINT_FILE, fingerprint, watermark=run_started, journal_path=CHECKPOINT_JOURNAL_FILE)
+    else:
+        writer = TagWriter(stash)
+    # a run that fails leaves the previous snapshot in place
+    with snapshot or nullcontext(), writer:
+        performer_filter = {}
+        if getattr(config, "FILTER_PERFORMERS_IN_STASH", True):
+            performer_filter = taggable_performer_filter()
+        # nothing can be stale before any managed tag exists, e.g. a dry run that created none
+        if performer_filter and all_tag_ids:
+            # performers excluded by the filter are never fetched, strip plugin tags from any of them still holding one
+            with stats.stage("stale_scan"):
+                stale_filter = {**managed_tags_filter(all_tag_ids), **updated_filter, "NOT": performer_filter}
+                stale_ids = [p["id"] for performers in iter_performer_pages(f=stale_filter, fragment="id") for p in performers]
+            if stale_ids:
+                log.info(f"Removing plugin tags from {len(stale_ids)} performer(s) that no longer qualify...")
+                stats.counters["stale"] += len(stale_ids)
+                writer.update(stale_ids, [enum for enum in tag_enums if enum.tag_id], "REMOVE")
+
+        if updated_filter:
+            # stash only allows one AND/OR/NOT per level, nest the taggable filter under AND
+            performer_filter = {**updated_filter, "AND": performer_filter} if performer_filter else updated_filter
+
+        log.info("Parsing Performers...")
+        pages = iter_performer_pages(f=performer_filter)
+        if pipeline:
+            # tag writes never change which performers the filter matches, so paging stays stable while writing
+            pages = prefetch_pages(pages, getattr(config, "PIPELINE_WINDOW", 2))
+        with parallel_classifier.performer_classifier() as classify:
+            for performers in stats.timed_iter("fetch", pages):
+                # the records parsed for classification are reused for the snapshot
+                records = [] if snapshot else None
+                with stats.stage("classify", profile=True):
+                    tag_updates = classify(performers, records)
+                with stats.stage("diff"):
+                    diff_tag_updates(performers, tag_updates, tag_enums, tag_adds, tag_removes)
+                if pipeline:
+                    with stats.stage("dispatch"):
+                        write_full_chunks(writer, tag_enums, tag_adds, tag_removes)
+                stats.count_tags(tag_updates, tag_enums)
+                if dry_run:
+                    writer.add_matches(tag_updates, tag_enums)
+                if snapshot:
+                    with stats.stage("snapshot"):
+                        snapshot.add(records)
+
+        stats.counters.update(PARSE_COUNTS)
+        stats.failures.update(PARSE_FAILURES)
+
+        write_started = time.perf_counter()
+        write_tag_diff(writer, tag_enums, tag_adds, tag_removes, verbose=not pipeline)
+        if pipeline:
+            log.info(f"Queued {stats.counters['added']} tag addition(s) and {stats.counters['removed']} removal(s) while fetching performers")
+    # queued chunks are only known to be written once the writer has exited
+    stats.stage_times["write"] += time.perf_counter() - write_started
+
+    if checkpoint:
+        with stats.stage("write"):
+            write_plan(read_checkpoint(), CHECKPOINT_JOURNAL_FILE)
+
+    if snapshot:
+        log.info(f"Saved metrics of {snapshot.rows} performer(s) to {SNAPSHOT_FILE}")
+
+    # worker processes keep their own caches, only in-process parsing is counted here
+    log_cache_stats("Measurement parse cache", measurement_cache_stats())
+    log_cache_stats("Classification cache", classification_cache_stats())
+
+    if not dry_run:
+        save_json(STATE_FILE, {"watermark": run_started, "fingerprint": fingerprint, "tag_ids": managed_tag_ids()})
+
+def log_cache_stats(name, counters):
+    """logs counters from cache_stats(), nothing when the cache was not used"""
+    if counters["hits"] or counters["misses"]:
+        log.info(f"{name}: {counters['hits']} hits, {counters['misses']} misses ({counters['hit_rate']:.0%} reused)")
+
+def read_checkpoint():
+    from tag_writer import read_plan
+    return read_plan(CHECKPOINT_FILE)
+
+def resume_checkpoint():
+    """finishes the writes of a run that was interrupted, returns False when there is nothing to resume"""
+    from tag_writer import Journal
+
+    plan = read_checkpoint()
+    if plan is None:
+        return False
+    if plan.header.get("fingerprint") != config_fingerprint(config.TAGS_TO_USE):
+        log.info("Tag rules changed since the interrupted run, discarding its checkpoint")
+        remove_file(CHECKPOINT_FILE)
+        remove_file(CHECKPOINT_JOURNAL_FILE)
+        return False
+
+    log.info(f"Resuming the run from {plan.header.get('created')}, {len(Journal(CHECKPOINT_JOURNAL_FILE, plan.header.get('plan_id')))} chunk(s) were already written")
+    with stats.stage("tag_init"):
+        init_tag_ids()
+    with stats.stage("write"):
+        write_plan(plan, CHECKPOINT_JOURNAL_FILE)
+    save_json(STATE_FILE, {"watermark": plan.header.get("watermark"), "fingerprint": plan.header.get("fingerprint"), "tag_ids": managed_tag_ids()})
+    return True
+
+def write_plan(plan, journal_path, count=False):
+    """writes the ADD/REMOVE updates of plan to stash, skipping chunks journal_path records as written
 
+    the plan and journal are removed once every chunk is written, after a failure both are
+    kept so the next attempt only sends the chunks that are left
+    """
+    from tag_writer import TagWriter, Journal, chunked
+
+    tag_enums = {str(enum): enum for enum in get_tag_enums()}
+    with Journal(journal_path, plan.header.get("plan_id")) as journal, TagWriter(stash, chunk_size=plan.header.get("chunk_size")) as writer:
+        for i, (mode, tag_names, performer_ids) in enumerate(plan.updates()):
+            tag_ids = [tag_enums[name].tag_id for name in tag_names if name in tag_enums and tag_enums[name].tag_id]
+            if count:
+                stats.counters["added" if mode == "ADD" else "removed"] += len(performer_ids) * len(tag_ids)
+            offset = 0
+            for chunk in chunked(performer_ids, writer.chunk_size):
+                # keyed on the id range written rather than the chunk number, a plan replayed
+                # with another chunk size then resends ranges instead of skipping unwritten ids
+                key = f"{i}:{offset}:{offset + len(chunk)}"
+                offset += len(chunk)
+                if key in journal:
+                    stats.counters["skipped_chunks"] += 1
+                    continue
+                writer.update_ids(chunk, tag_ids, mode, on_written=lambda key=key: journal.record(key))
+    remove_file(plan.path)
+    remove_file(journal_path)
+
+def write_tag_diff(writer, tag_enums, tag_adds, tag_removes, verbose=True):
+    for enum in tag_enums:
+        if performer_ids := tag_removes.get(enum):
+            if verbose:
+                log.info(f"Removing {enum} tag from {len(performer_ids)} performer(s)...")
+            stats.counters["removed"] += len(performer_ids)
+            writer.update(performer_ids, [enum], "REMOVE")
+        if performer_ids := tag_adds.get(enum):
+            if verbose:
+                log.info(f"Adding {enum} tag to {len(performer_ids)} performer(s)...")
+            stats.counters["added"] += len(performer_ids)
+            writer.update(performer_ids, [enum], "ADD")
+
+def write_full_chunks(writer, tag_enums, tag_adds, tag_removes):
+    """queues every complete write chunk in tag_adds/tag_removes and keeps the remainder
+
+    the writer blocks once its in-flight window is full, so writes pace the fetching
+    while sending the same number of requests as writing everything at the end
+    """
+    for updates, mode, counter in ((tag_removes, "REMOVE", "removed"), (tag_adds, "ADD", "added")):
+        for enum in tag_enums:
+            performer_ids = updates.get(enum)
+            if not performer_ids or len(performer_ids) < writer.chunk_size:
+                continue
+            full = len(performer_ids) - len(performer_ids) % writer.chunk_size
+            stats.counters[counter] += full
+            writer.update(performer_ids[:full], [enum], mode)
+            del performer_ids[:full]
+
+def reclassify_snapshot():
+    """retags performers from the metrics saved by the last full run without fetching or parsing them
+
+    only performers currently holding a plugin tag are fetched to find the tag changes,
+    edits made to performers since the snapshot was saved are not seen
+    """
+    import batch_classifier
+    from tag_writer import TagWriter
+
+    if batch_classifier.np is None:
+        log.error("Reclassifying from a snapshot requires numpy (pip install numpy)")
+        return
+    columns = batch_classifier.load_snapshot(SNAPSHOT_FILE)
+    if columns is None:
+        log.warning(f"No snapshot found at {SNAPSHOT_FILE}, enable SAVE_SNAPSHOT and run 'Calculate' first")
+        return
+    log.info(f"Reclassifying {len(columns)} performer(s) from the snapshot saved {utc_timestamp(os.path.getmtime(SNAPSHOT_FILE))}")
+
+    log.info("Finding Tags in Stash...")
+    with stats.stage("tag_init"):
+        tag_enums = get_tag_enums()
+        all_tag_ids = init_tag_ids()
+
+    with stats.stage("classify"):
+        tag_updates = batch_classifier.columns_tag_updates(columns, defaultdict(list))
+    stats.count_tags(tag_updates, tag_enums)
+
+    tag_adds = defaultdict(list)
+    tag_removes = defaultdict(list)
+    holders = []
+    if all_tag_ids:
+        with stats.stage("fetch"):
+            holders = [p for performers in iter_performer_pages(f=managed_tags_filter(all_tag_ids), fragment="id tags { id }") for p in performers]
+    with stats.stage("diff"):
+        diff_tag_updates(holders, tag_updates, tag_enums, tag_adds, tag_removes)
+
+    with stats.stage("write"), TagWriter(stash) as writer:
+        write_tag_diff(writer, tag_enums, tag_adds, tag_removes)
+
+def run_report():
+    """saves distributions of every performer metric and tag bucket to REPORT_FILE, nothing is written to stash"""
+    from performer_report import PerformerReport
+
+    performer_filter = taggable_performer_filter() if getattr(config, "FILTER_PERFORMERS_IN_STASH", True) else {}
+    report = PerformerReport()
     log.info("Parsing Performers...")
+    for performers in stats.timed_iter("fetch", iter_performer_pages(f=performer_filter)):
+        with stats.stage("report"):
+            for p in parse_performers(performers):
+                report.add(p)
+    stats.counters.update(PARSE_COUNTS)
+    stats.failures.update(PARSE_FAILURES)
+
+    save_json(REPORT_FILE, report.to_dict())
+    for line in report.summary_lines():
+        log.info(line)
+    log.info(f"Saved report to {REPORT_FILE}")
+
+def apply_plan():
+    """writes the tag changes saved by a dry run to stash"""
+    from tag_writer import read_plan
+    plan = read_plan(PLAN_FILE)
+    if plan is None:
+        log.warning(f"No plan found at {PLAN_FILE}, run 'Calculate (Dry Run)' first")
+        return
+    if plan.header.get("fingerprint") != config_fingerprint(config.TAGS_TO_USE):
+        log.warning("Tag rules changed since the plan was created, applying it anyway")
+
+    log.info("Finding Tags in Stash...")
+    with stats.stage("tag_init"):
+        init_tag_ids()
+
+    log.info(f"Applying plan from {plan.header.get('created')}...")
+    with stats.stage("write"):
+        write_plan(plan, PLAN_JOURNAL_FILE, count=True)
+
+def get_tag_enums():
+    """every tag enum member in config.TAGS_TO_USE"""
+    return [enum for enum_class in get_tag_classes() for enum in enum_class if isinstance(enum, config.TAGS_TO_USE)]
+
+def diff_tag_updates(performers, tag_updates, tag_enums, tag_adds, tag_removes):
+    """compares the tags performers currently hold against tag_updates
+
+    only the delta is appended to tag_adds/tag_removes, performers already
+    holding the correct tags produce no writes
+    """
+    managed_tags = {enum.tag_id: enum for enum in tag_enums if enum.tag_id}
+    current = defaultdict(set)
     for p in performers:
-        if p.get("gender") != 'FEMALE':
-            continue
+        for tag in p.get("tags", []):
+            if enum := managed_tags.get(tag["id"]):
+                current[enum].add(p["id"])
+
+    for enum in tag_enums:
+        desired = tag_updates.get(enum, [])
+        held = current.get(enum, set())
+        tag_adds[enum].extend(p_id for p_id in desired if p_id not in held)
+        tag_removes[enum].extend(held.difference(desired))
+    return tag_adds, tag_removes
+
+def iter_performer_pages(f={}, fragment=PERFORMER_FRAGMENT, per_page=None):
+    """yields performers one page at a time so only a single page is held in memory
 
-        p_id = f"{p['name']} ({p['id']})"
+    per_page defaults to config.PERFORMER_PAGE_SIZE, -1 fetches every performer in one request
+    """
+    if per_page is None:
+        per_page = getattr(config, "PERFORMER_PAGE_SIZE", 1000)
+    page = 1
+    while True:
+        count, performers = stash.find_performers(
+            f=f,
+            filter={"page": page, "per_page": per_page, "sort": "id", "direction": "ASC"},
+            fragment=fragment,
+            get_count=True
+        )
+        if performers:
+            yield performers
+        if not performers or per_page < 0 or page * per_page >= count:
+            break
+        log.progress(page * per_page / count)
+        page += 1
+
+def prefetch_pages(pages, window):
+    """yields from pages while a background thread fetches up to window pages ahead"""
+    import queue, threading
+
+    fetched = queue.Queue(maxsize=max(window, 1))
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # gives up once the consumer is gone so the thread never stays blocked on a full queue
+        while not stop.is_set():
+            try:
+                fetched.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch():
         try:
-            p = StashPerformer(p)
-            p.get_tag_updates(tag_updates)
-        except DebugException as e:
-            log.debug(f"{p_id:>30}: {e}")
-        except WarningException as e:
-            log.warning(f"{p_id:>30}: {e}")
+            for page in pages:
+                if not put((page, None)):
+                    return
+            put((done, None))
         except Exception as e:
-            log.error(f"{p_id:>30}: {e}")
-
-    for enum, performer_ids in tag_updates.items():
-        if not isinstance(enum, config.TAGS_TO_USE):
-            log.debug(f"{enum} not in config skipping")
-            continue
-        if not performer_ids:
-            continue
-        log.info(f"Adding {enum} tag to {len(performer_ids)} performer(s)...")
-        stash.update_performers({
-            "ids": performer_ids,
-            "tag_ids":{
-                "ids": [enum.tag_id],
-                "mode": "ADD"
-            }
-        })
-
-def enumtag_stash_init(enum_class, tag_id_list=[]):
-    for enum in enum_class:
-        if not isinstance(enum, config.TAGS_TO_USE):
-            continue
-        tag_alias_id = f"PBC:{enum}"
-        stash_tag = stash.find_tag(tag_alias_id, on_multiple=OnMultipleMatch.RETURN_NONE)
-        if stash_tag:
-            enum.tag_id = stash_tag["id"]
-        else:
-            tag_create_input = enum.value.tag_create_input(str(enum), tag_alias_id)
-            enum.tag_id = stash.find_tag(tag_create_input, create=True)["id"]
-        tag_id_list.append(enum.tag_id)
-    return tag_id_list
+            put((done, e))
 
+    threading.Thread(target=fetch, name="pbc-prefetch", daemon=True).start()
+    try:
+        while True:
+            page, error = fetched.get()
+            if error:
+                raise error
+            if page is done:
+                return
+            yield page
+    finally:
+        stop.set()
+
+def init_tag_ids(validate=True, create=True):
+    """sets tag_id on every enum in config.TAGS_TO_USE and returns the list of tag ids
+
+    alias to id mappings are cached in TAG_CACHE_FILE, with validate=False a complete
+    cache is trusted without contacting stash. Otherwise every managed tag is looked up
+    in a single request and any missing tags are created in one batch, with create=False
+    missing tags are left with a tag_id of None
+    """
+    tag_enums = {f"PBC:{enum}": enum for enum in get_tag_enums()}
+
+    alias_ids = load_json(TAG_CACHE_FILE, {})
+    if validate or not all(alias in alias_ids for alias in tag_enums):
+        alias_ids = {}
+        for tag in stash.find_tags(f=MANAGED_TAG_FILTER, fragment="id aliases"):
+            for alias in tag["aliases"]:
+                if alias.startswith("PBC:"):
+                    alias_ids[alias] = tag["id"]
+        missing = [enum for alias, enum in tag_enums.items() if alias not in alias_ids]
+        if missing and create:
+            log.info(f"Creating {len(missing)} tag(s)...")
+            alias_ids.update(create_tags(missing))
+        save_json(TAG_CACHE_FILE, alias_ids)
+
+    for alias, enum in tag_enums.items():
+        enum.tag_id = alias_ids.get(alias)
+    return [enum.tag_id for enum in tag_enums.values() if enum.tag_id]
+
+def managed_tag_ids():
+    """tag id of every enum in config.TAGS_TO_USE by name, as set by init_tag_ids()"""
+    return {str(enum): enum.tag_id for enum in get_tag_enums()}
+
+def create_tags(tag_enums):
+    """creates tags for tag_enums in a single mutation, returns a mapping of alias to tag id"""
+    tag_inputs = {f"tag{i}": enum.value.tag_create_input(str(enum), f"PBC:{enum}") for i, enum in enumerate(tag_enums)}
+    variables = ", ".join(f"${key}: TagCreateInput!" for key in tag_inputs)
+    mutations = "\n".join(f"{key}: tagCreate(input: ${key}) {{ id }}" for key in tag_inputs)
+    try:
+        result = stash.call_GQL(f"mutation CreateTags({variables}) {{\n{mutations}\n}}", tag_inputs)
+        return {f"PBC:{enum}": result[f"tag{i}"]["id"] for i, enum in enumerate(tag_enums)}
+    except Exception as e:
+        # a tag with the same name but no managed description makes the batch fail, resolve one by one
+        log.debug(f"batch tag create failed, creating tags individually: {e}")
+    return {f"PBC:{enum}": enumtag_stash_init(enum) for enum in tag_enums}
+
+def enumtag_stash_init(enum):
+    from stashapi.stash_types import OnMultipleMatch
+    tag_alias_id = f"PBC:{enum}"
+    stash_tag = stash.find_tag(tag_alias_id, on_multiple=OnMultipleMatch.RETURN_NONE)
+    if stash_tag:
+        enum.tag_id = stash_tag["id"]
+    else:
+        tag_create_input = enum.value.tag_create_input(str(enum), tag_alias_id)
+        enum.tag_id = stash.find_tag(tag_create_input, create=True)["id"]
+    return enum.tag_id
 
 if __name__ == '__main__':
     main()
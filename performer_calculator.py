@@ -1,4 +1,7 @@
 import re, sys
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import NamedTuple
 
 import config
 from body_tags import *
@@ -11,6 +14,9 @@ except ModuleNotFoundError:
     print("If you have pip (normally installed with python), run this command in a terminal (cmd): 'pip install stashapp-tools'", file=sys.stderr)
     sys.exit()
 
+load_rules(getattr(config, "CLASSIFICATION_RULES", None))
+set_classification_cache_size(getattr(config, "CLASSIFICATION_CACHE_SIZE", 4096))
+
 class DebugException(Exception):
     pass
 class WarningException(Exception):
@@ -27,13 +33,117 @@ weight
 height_cm
 ethnicity
 gender
+tags { id }
 """
 
-class StashPerformer:
-
-    def __init__(self, resp) -> None:
-
-        self.__dict__.update(resp)
+def taggable_performer_filter():
+    """PerformerFilterType matching FEMALE performers that have measurements or a height
+
+    performers outside this filter can never receive a tag, filtering them in stash
+    avoids transferring and parsing them at all
+    """
+    female = {"value": "FEMALE", "modifier": "EQUALS"}
+    return {
+        "gender": female,
+        "measurements": {"value": "", "modifier": "NOT_NULL"},
+        "OR": {
+            "gender": female,
+            "height_cm": {"value": 0, "modifier": "GREATER_THAN"},
+        }
+    }
+
+def managed_tags_filter(tag_ids):
+    """PerformerFilterType matching performers that have any of the given tags"""
+    return {"tags": {"value": tag_ids, "modifier": "INCLUDES"}}
+
+MEASUREMENTS_PATTERN = re.compile(r"""^(?:
+    # Full Measurements | Band, Cup Size, Waist, Hips | Example: "32D-28-34"
+    (?P<band>\d+)(?P<cupsize>[a-zA-Z]+)\-(?P<waist>\d+)\-(?P<hips>\d+)
+    # Fashion Measurements | Bust, Waist, Hips | Example: "36-28-34"
+    |(?P<fashion_bust>\d+)\-(?P<fashion_waist>\d+)\-(?P<fashion_hips>\d+)
+    # Bra Measurements | Band, Cup Size | Example: "32D" or "32D (81D)"
+    |(?P<bra_band>\d+)(?P<bra_cupsize>[a-zA-Z]+)(?:\ ?\(\d+[a-zA-Z]+\))?
+)$""", re.VERBOSE)
+
+class Measurements(NamedTuple):
+    band: float
+    cupsize: str
+    bust: float
+    waist: float
+    hips: float
+    bust_band_diff: int
+    breast_volume: float
+    metric: bool
+
+def to_float(value):
+    return float(value) if value else None
+
+@lru_cache(maxsize=getattr(config, "MEASUREMENT_CACHE_SIZE", 4096))
+def parse_measurement_string(measurements):
+    """parses a measurement string with spaces removed into imperial Measurements
+
+    returns None if the string is not in a known format, results are cached as the
+    same measurements repeat across many performers
+    """
+    match = MEASUREMENTS_PATTERN.match(measurements)
+    if not match:
+        return None
+    m = match.groupdict()
+
+    cupsize = m["cupsize"] or m["bra_cupsize"]
+    cupsize = cupsize.upper() if cupsize else None
+    band  = to_float(m["band"] or m["bra_band"])
+    bust  = to_float(m["fashion_bust"])
+    waist = to_float(m["waist"] or m["fashion_waist"])
+    hips  = to_float(m["hips"] or m["fashion_hips"])
+
+    # convert metric to imperial
+    metric = False
+    if band and band > 50 and waist and waist > 50 and hips and hips > 50:
+        band  = band / CM_TO_INCH
+        waist = waist / CM_TO_INCH
+        hips  = hips / CM_TO_INCH
+        metric = True
+    elif bust and bust > 50 and waist and waist > 50 and hips and hips > 50:
+        bust  = bust / CM_TO_INCH
+        waist = waist / CM_TO_INCH
+        hips  = hips / CM_TO_INCH
+        metric = True
+
+    bust_band_diff = None
+    breast_volume = None
+    if band and cupsize:
+        bust_band_diff = get_bust_band_difference(cupsize)
+        bust = band + bust_band_diff
+        breast_volume = (band / 2.0) + bust_band_diff
+
+    return Measurements(band, cupsize, bust, waist, hips, bust_band_diff, breast_volume, metric)
+
+def measurement_cache_stats():
+    """hit/miss counters of the parse_measurement_string() cache"""
+    return cache_stats(parse_measurement_string)
+
+class PerformerRecord:
+    """compact performer holding only the fields the classifiers read
+
+    assigned tags are kept as a bitmask over TAG_MEMBERS instead of a list of enums
+    """
+    __slots__ = (
+        "id", "name", "gender", "ethnicity",
+        "cupsize", "band", "bust", "waist", "hips",
+        "bust_band_diff", "breast_volume",
+        "height_cm", "weight", "bmi",
+        "tag_bits",
+    )
+
+    def __init__(self, resp, classify=True) -> None:
+
+        self.id        = resp["id"]
+        self.name      = resp.get("name")
+        self.gender    = resp.get("gender")
+        self.ethnicity = resp.get("ethnicity")
+        self.weight    = resp.get("weight")
+        self.height_cm = resp.get("height_cm")
 
         self.cupsize        = None
         self.band           = None
@@ -46,80 +156,54 @@ class StashPerformer:
 
         self.bmi = 0
 
-        self.tags_list = []
+        self.tag_bits = 0
 
-        self.parse_measurements()
+        self.parse_measurements(resp.get("measurements"))
         self.calculate_bmi()
-        self.set_bmi_tag()
-
-        self.set_breast_size()
-        self.set_breast_cup()
-
-        self.set_hip_size()
+        if classify:
+            self.classify()
+
+    def classify(self):
+        self.tag_bits |= classify_measurements(
+            self.cupsize, self.bust, self.waist, self.hips, self.breast_volume,
+            self.height_cm, self.bmi, self.region(), self.gender == 'FEMALE'
+        )
+        # logged here rather than in the cached classification so every performer is reported
+        if not self.tag_bits & SHAPE_BITS:
+            p_id = f"{self.name} ({self.id})"
+            if not self.bust or not self.waist or not self.hips:
+                log.debug(f"{p_id:>30}: could not classify bodyshape, missing required measurements")
+            else:
+                log.warning(f"{p_id:>30}: could not classify bodyshape bust={self.bust:.0f} waist={self.waist:.0f} hips={self.hips:.0f}")
 
-        self.set_butt_size()
+    def add_tag(self, tag_enum):
+        self.tag_bits |= TAG_BITS[tag_enum]
 
-        self.set_height_type()
+    def has_tag(self, tag_enum):
+        return bool(self.tag_bits & TAG_BITS[tag_enum])
 
-        self.match_body_shapes()
-        self.set_type_descriptor()
-         
-    def parse_measurements(self):
+    def parse_measurements(self, measurements):
         if self.weight:
             self.weight = float(self.weight)
         if self.height_cm:
             self.height_cm = float(self.height_cm)
 
-        self.measurements = self.measurements.replace(" ", "")
+        measurements = measurements.replace(" ", "")
 
-        if self.measurements == "":
+        if measurements == "":
             log.debug(f"No measurements found for {str(self)}")
             return
 
-        # Full Measurements | Band, Cup Size, Waist, Hips | Example: "32D-28-34"
-        band_cup_waist_hips = re.match(r'^(?P<band>\d+)(?P<cupsize>[a-zA-Z]+)\-(?P<waist>\d+)\-(?P<hips>\d+)$', self.measurements)
-        if band_cup_waist_hips:
-            m = band_cup_waist_hips.groupdict()
-        else:
-            # Fashion Measurements | Bust, Waist, Hips | Example: "36-28-34"
-            bust_waist_hips = re.match(r'^(?P<bust>\d+)\-(?P<waist>\d+)\-(?P<hips>\d+)$', self.measurements)
-            if bust_waist_hips:
-                m = bust_waist_hips.groupdict()
-            else:
-                # Bra Measurements | Band, Cup Size | Example: "32D" or "32D (81D)"
-                band_cup = re.match(r'^(?P<band>\d+)(?P<cupsize>[a-zA-Z]+)(?: ?\(\d+[a-zA-Z]+\))?$', self.measurements)
-                if band_cup:
-                    m = band_cup.groupdict()
-                else:
-                    raise WarningException(f"could not parse measurements: '{self.measurements}'")
-
-        if m.get("cupsize"):
-            self.cupsize = m.get("cupsize", "").upper()
-        if m.get("band"):
-            self.band    = float(m.get("band", 0))
-        if m.get("bust"):
-            self.bust    = float(m.get("bust", 0))
-        if m.get("waist"):
-            self.waist   = float(m.get("waist",0))
-        if m.get("hips"):
-            self.hips    = float(m.get("hips", 0))
-
-        # convert metric to imperial
-        if self.band and self.band > 50 and self.waist and self.waist > 50 and self.hips and self.hips > 50:
-            self.band  = self.band / CM_TO_INCH
-            self.waist = self.waist / CM_TO_INCH
-            self.hips  = self.hips / CM_TO_INCH
-            log.debug(f"converted measurements from metric {self.measurements} -> {self.band}{self.cupsize}-{self.waist}-{self.hips}")
-        elif self.bust and self.bust > 50 and self.waist and self.waist > 50 and self.hips and self.hips > 50:
-            self.bust  = self.bust / CM_TO_INCH
-            self.waist = self.waist / CM_TO_INCH
-            self.hips  = self.hips / CM_TO_INCH
-            log.debug(f"converted measurements from metric {self.measurements} -> {self.bust}-{self.waist}-{self.hips}")
+        m = parse_measurement_string(measurements)
+        if not m:
+            raise WarningException(f"could not parse measurements: '{measurements}'")
+        self.band, self.cupsize, self.bust, self.waist, self.hips, self.bust_band_diff, self.breast_volume, metric = m
 
-        if self.band and self.cupsize:
-            self.bust_band_diff = get_bust_band_difference(self.cupsize)
-            self.bust = self.band + self.bust_band_diff
-            self.breast_volume = (self.band / 2.0) + self.bust_band_diff
+        if metric and self.band:
+            log.debug(f"converted measurements from metric {measurements} -> {self.band}{self.cupsize}-{self.waist}-{self.hips}")
+        elif metric:
+            log.debug(f"converted measurements from metric {measurements} -> {self.bust}-{self.waist}-{self.hips}")
+        if self.breast_volume:
             log.debug(f"Bra size {int(self.band)}{self.cupsize} converted to {(self.band / 2.0)} + {self.bust_band_diff} = {self.breast_volume} volume points")
 
     def calculate_bmi(self):
@@ -128,68 +212,12 @@ class StashPerformer:
         breast_weight = approximate_breast_weight(self.bust_band_diff)
         self.bmi = (self.weight-breast_weight) / (self.height_cm/100) ** 2
 
-    def match_body_shapes(self):
-        self.body_shapes = calculate_shape(self)
-        for body_shape in self.body_shapes:
-            self.tags_list.append(body_shape)
-        if not self.body_shapes:
-            p_id = f"{self.name} ({self.id})"
-            if not self.bust or not self.waist or not self.hips:
-                log.debug(f"{p_id:>30}: could not classify bodyshape, missing required measurements")
-            else:
-                log.warning(f"{p_id:>30}: could not classify bodyshape bust={self.bust:.0f} waist={self.waist:.0f} hips={self.hips:.0f}")
-
-    def set_type_descriptor(self):
-        descriptor = None
-        if not self.bmi:
-            return
-        descriptor = BodyType.match_threshold(self.bmi)
-        if descriptor == BodyType.FIT and HeightType.SHORT.within_threshold(self.height_cm):
-            descriptor = BodyType.PETITE
-        if descriptor == BodyType.AVERAGE and self.body_shapes and any(bs in self.body_shapes for bs in CURVY_SHAPES):
-            descriptor = BodyType.CURVY
-        if descriptor:
-            self.tags_list.append(descriptor)
-
-    def set_breast_size(self):
-        if not self.breast_volume:
-            return
-        if breast_size := BreastSize.match_threshold(self.breast_volume):
-            self.tags_list.append(breast_size)
-
-    def set_breast_cup(self):
-        if not self.cupsize:
-            return
-        if breast_cup := BreastCup.match_threshold(self.cupsize):
-            self.tags_list.append(breast_cup)
-
-    def set_hip_size(self):
-        if hip_size := calculate_hip_size(self):
-            self.tags_list.append(hip_size)
-
-    def set_butt_size(self):
-        if not self.hips:
-            return
-        if butt_size := ButtSize.match_threshold(self.hips):
-            self.tags_list.append(butt_size)
-    
-    def set_height_type(self):
-        # only tuned on female heights
-        if not self.height_cm or self.gender != 'FEMALE':
-            return
-        if self.height_cm > 160 and self.height_cm < 180:
-            height_type = HeightType.AVERAGE
-        else:
-            height_type = HeightType.match_threshold(self.height_cm)
-        if height_type:
-            self.tags_list.append(height_type)
-
-    def set_bmi_tag(self):
-        if bmi_tag := calculate_bmi(self):
-            self.tags_list.append(bmi_tag)
+    def region(self):
+        """ethnicity as used to pick regional rules, a missing ethnicity uses the default rules"""
+        return self.ethnicity.title() if self.ethnicity else ""
 
     def get_tag_updates(self, tag_updates={}):
-        for tag_enum in self.tags_list:
+        for tag_enum in tags_from_bits(self.tag_bits):
             tag_updates[tag_enum].append(self.id)
 
     def __str__(self) -> str:
@@ -207,3 +235,80 @@ class StashPerformer:
     def __repr__(self) -> str:
         return str(self)
 
+class StashPerformer(PerformerRecord):
+    """compatibility wrapper around PerformerRecord that keeps the full stash response"""
+
+    def __init__(self, resp, classify=True) -> None:
+        self.__dict__.update((k, v) for k, v in resp.items() if k not in PerformerRecord.__slots__)
+        super().__init__(resp, classify)
+
+    @property
+    def tags_list(self):
+        return tags_from_bits(self.tag_bits)
+
+    @property
+    def body_shapes(self):
+        return [tag_enum for tag_enum in self.tags_list if isinstance(tag_enum, BodyShape)]
+
+# performers seen by parse_performers() and failures by exception class name, read by run statistics
+PARSE_COUNTS = Counter()
+PARSE_FAILURES = Counter()
+
+def reset_parse_counts():
+    PARSE_COUNTS.clear()
+    PARSE_FAILURES.clear()
+
+def classify_performers(performers, records=None):
+    """returns the performer ids for each tag enum, using the engine set in config.CLASSIFIER_ENGINE
+
+    parsed PerformerRecord objects are appended to records when it is given
+    """
+    tag_updates = defaultdict(list)
+    if use_batch_classifier():
+        import batch_classifier
+        parsed = list(parse_performers(performers, classify=False))
+        batch_classifier.get_tag_updates(parsed, tag_updates)
+        if records is not None:
+            records.extend(parsed)
+    else:
+        for p in parse_performers(performers):
+            p.get_tag_updates(tag_updates)
+            if records is not None:
+                records.append(p)
+    return tag_updates
+
+def use_batch_classifier():
+    if getattr(config, "CLASSIFIER_ENGINE", "scalar") != "numpy":
+        return False
+    # numpy takes longer to import than the rest of the plugin, only load it when it is used
+    import batch_classifier
+    if batch_classifier.np is None:
+        log.warning("CLASSIFIER_ENGINE is 'numpy' but numpy is not installed, falling back to 'scalar'")
+        config.CLASSIFIER_ENGINE = "scalar"
+        return False
+    return True
+
+def parse_performers(performers, classify=True):
+    """yields a PerformerRecord for each FEMALE performer that parses, failures are logged and skipped"""
+    for p in performers:
+        if p.get("gender") != 'FEMALE':
+            PARSE_COUNTS["skipped"] += 1
+            continue
+
+        p_id = f"{p['name']} ({p['id']})"
+        try:
+            performer = PerformerRecord(p, classify)
+        except DebugException as e:
+            log.debug(f"{p_id:>30}: {e}")
+            PARSE_FAILURES[type(e).__name__] += 1
+            continue
+        except WarningException as e:
+            log.warning(f"{p_id:>30}: {e}")
+            PARSE_FAILURES[type(e).__name__] += 1
+            continue
+        except Exception as e:
+            log.error(f"{p_id:>30}: {e}")
+            PARSE_FAILURES[type(e).__name__] += 1
+            continue
+        PARSE_COUNTS["parsed"] += 1
+        yield performer
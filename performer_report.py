@@ -0,0 +1,146 @@
+import math
+from collections import Counter, defaultdict
+
+from body_tags import *
+
+# metric -> (low, high, bins) of its histogram, values outside the range are counted as under/overflow
+METRIC_BINS = {
+    "band":          (24, 48, 48),
+    "bust":          (24, 60, 72),
+    "waist":         (16, 52, 72),
+    "hips":          (24, 64, 80),
+    "breast_volume": (8, 40, 64),
+    "height_cm":     (130, 200, 70),
+    "weight":        (30, 150, 120),
+    "bmi":           (10, 60, 100),
+}
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+class RunningStats:
+    """count, mean, variance (Welford), min and max of a stream of values in constant memory"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def sd(self):
+        return math.sqrt(self.variance)
+
+class Histogram:
+    """fixed width bins between low and high, quantiles are interpolated within a bin"""
+
+    def __init__(self, low, high, bins) -> None:
+        self.low = low
+        self.high = high
+        self.width = (high - low) / bins
+        self.counts = [0] * bins
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, value):
+        if value < self.low:
+            self.underflow += 1
+        elif value >= self.high:
+            self.overflow += 1
+        else:
+            self.counts[int((value - self.low) / self.width)] += 1
+
+    def quantile(self, q):
+        """approximate q quantile, clamped to low/high when it falls in the under/overflow"""
+        total = self.underflow + sum(self.counts) + self.overflow
+        if not total:
+            return None
+        rank = q * total
+        if rank <= self.underflow:
+            return self.low
+        seen = self.underflow
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                return self.low + self.width * (i + (rank - seen) / count)
+            seen += count
+        return self.high
+
+    def to_dict(self):
+        return {"low": self.low, "high": self.high, "counts": self.counts, "underflow": self.underflow, "overflow": self.overflow}
+
+class MetricSummary:
+    def __init__(self, metric) -> None:
+        self.stats = RunningStats()
+        self.histogram = Histogram(*METRIC_BINS[metric])
+
+    def add(self, value):
+        self.stats.add(value)
+        self.histogram.add(value)
+
+    def to_dict(self):
+        if not self.stats.count:
+            return {"count": 0}
+        return {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "sd": self.stats.sd,
+            "min": self.stats.min,
+            "max": self.stats.max,
+            "quantiles": {str(q): self.histogram.quantile(q) for q in QUANTILES},
+            "histogram": self.histogram.to_dict(),
+        }
+
+class PerformerReport:
+    """streaming distribution of parsed performer metrics and tag buckets, segmented by ethnicity
+
+    memory only grows with the number of distinct ethnicities, never with the number of performers
+    """
+    def __init__(self) -> None:
+        self.metrics = defaultdict(lambda: {metric: MetricSummary(metric) for metric in METRIC_BINS})
+        self.buckets = defaultdict(Counter)
+
+    def add(self, performer):
+        """adds a classified PerformerRecord"""
+        for segment in ("All", performer.ethnicity.title() if performer.ethnicity else "Unknown"):
+            metrics = self.metrics[segment]
+            for metric in METRIC_BINS:
+                value = getattr(performer, metric)
+                if value:
+                    metrics[metric].add(value)
+            buckets = self.buckets[segment]
+            for tag_enum in tags_from_bits(performer.tag_bits):
+                buckets[str(tag_enum)] += 1
+
+    def to_dict(self):
+        return {
+            segment: {
+                "metrics": {metric: summary.to_dict() for metric, summary in metrics.items()},
+                "buckets": dict(sorted(self.buckets[segment].items())),
+            }
+            for segment, metrics in self.metrics.items()
+        }
+
+    def summary_lines(self, segment="All"):
+        lines = []
+        for metric, summary in self.metrics.get(segment, {}).items():
+            s = summary.stats
+            if not s.count:
+                continue
+            quantiles = " ".join(f"p{q * 100:g}={summary.histogram.quantile(q):.1f}" for q in QUANTILES)
+            lines.append(f"{metric:>14}: n={s.count} mean={s.mean:.2f} sd={s.sd:.2f} min={s.min:.1f} max={s.max:.1f} {quantiles}")
+        buckets = self.buckets.get(segment, {})
+        for enum_class in get_tag_classes():
+            counts = ", ".join(f"{enum.name}={buckets.get(str(enum), 0)}" for enum in enum_class)
+            lines.append(f"{enum_class.__name__:>14}: {counts}")
+        return lines
@@ -0,0 +1,52 @@
+import os, json, hashlib
+from datetime import datetime, timezone
+
+# local state is kept next to the plugin so it survives between task runs
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(PLUGIN_DIR, "pbc_state.json")
+TAG_CACHE_FILE = os.path.join(PLUGIN_DIR, "pbc_tag_cache.json")
+PLAN_FILE = os.path.join(PLUGIN_DIR, "pbc_plan.jsonl")
+PLAN_JOURNAL_FILE = os.path.join(PLUGIN_DIR, "pbc_plan_journal.jsonl")
+CHECKPOINT_FILE = os.path.join(PLUGIN_DIR, "pbc_checkpoint.jsonl")
+CHECKPOINT_JOURNAL_FILE = os.path.join(PLUGIN_DIR, "pbc_checkpoint_journal.jsonl")
+RUN_STATS_FILE = os.path.join(PLUGIN_DIR, "pbc_run_stats.json")
+PROFILE_FILE = os.path.join(PLUGIN_DIR, "pbc_profile.prof")
+# index of the snapshot, each column is saved next to it as pbc_snapshot.<column>.bin
+SNAPSHOT_FILE = os.path.join(PLUGIN_DIR, "pbc_snapshot.json")
+REPORT_FILE = os.path.join(PLUGIN_DIR, "pbc_report.json")
+
+def load_json(path, default=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def save_json(path, data):
+    # write then rename so an interrupted run never leaves a truncated file behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def utc_timestamp(timestamp=None):
+    """current time, or the given unix timestamp, in the RFC3339 format stash accepts for TimestampCriterionInput"""
+    moment = datetime.now(timezone.utc) if timestamp is None else datetime.fromtimestamp(timestamp, timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def config_fingerprint(tags_to_use):
+    """hash of the classification rules, changes whenever body_tags.py, the loaded rules or TAGS_TO_USE change"""
+    import body_tags
+    digest = hashlib.sha1()
+    with open(body_tags.__file__, "rb") as f:
+        digest.update(f.read())
+    digest.update(json.dumps(body_tags.RULES.table, sort_keys=True).encode())
+    for enum_class in tags_to_use:
+        digest.update(enum_class.__name__.encode())
+    return digest.hexdigest()
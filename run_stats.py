@@ -0,0 +1,127 @@
+import re, json, time, cProfile, threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+import stashapi.log as log
+
+from plugin_state import save_json, utc_timestamp
+
+OPERATION_PATTERN = re.compile(r"^\s*(?:query|mutation)\s+(\w+)")
+
+def payload_size(payload):
+    try:
+        return len(json.dumps(payload, separators=(",", ":"), default=str))
+    except (TypeError, ValueError):
+        return 0
+
+class RunStats:
+    """wall time per stage, GraphQL traffic and performer/tag counters for a single run"""
+
+    def __init__(self, mode) -> None:
+        self.mode = mode
+        self.started = utc_timestamp()
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+        self.stage_times = defaultdict(float)
+        self.counters = Counter()
+        self.failures = Counter()
+        self.tags_assigned = Counter()
+        self.gql_calls = Counter()
+        self.gql_request_bytes = 0
+        self.gql_response_bytes = 0
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def enable_profiler(self):
+        """profiles every stage entered with profile=True"""
+        self.profiler = cProfile.Profile()
+
+    @contextmanager
+    def stage(self, name, profile=False):
+        profiler = self.profiler if profile else None
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            self.stage_times[name] += time.perf_counter() - started
+
+    def timed_iter(self, name, iterable):
+        """yields from iterable, counting the time spent producing each item towards stage name"""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def instrument(self, stash):
+        """counts every GraphQL request stash sends along with the request and response sizes"""
+        gql = getattr(stash, "_GQL", None)
+        if gql is None:
+            return stash
+
+        def counted_gql(query, variables={}, *args, **kwargs):
+            result = gql(query, variables, *args, **kwargs)
+            operation = OPERATION_PATTERN.match(query)
+            request_bytes = len(query) + payload_size(variables)
+            response_bytes = payload_size(result)
+            with self.lock:
+                self.gql_calls[operation.group(1) if operation else "unnamed"] += 1
+                self.gql_request_bytes += request_bytes
+                self.gql_response_bytes += response_bytes
+            return result
+
+        stash._GQL = counted_gql
+        return stash
+
+    def count_tags(self, tag_updates, tag_enums):
+        """counts the performers given each tag, the classifiers also return tags left out of TAGS_TO_USE"""
+        for enum in tag_enums:
+            if performer_ids := tag_updates.get(enum):
+                self.tags_assigned[str(enum)] += len(performer_ids)
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started_at
+
+    def summary(self):
+        return {
+            "mode": self.mode,
+            "started": self.started,
+            "elapsed": round(self.elapsed, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stage_times.items()},
+            "counters": dict(self.counters),
+            "failures": dict(self.failures),
+            "tags_assigned": dict(self.tags_assigned),
+            "graphql": {
+                "calls": sum(self.gql_calls.values()),
+                "operations": dict(self.gql_calls),
+                "request_bytes": self.gql_request_bytes,
+                "response_bytes": self.gql_response_bytes,
+            },
+        }
+
+    def log_summary(self):
+        stages = " ".join(f"{name} {seconds:.1f}s" for name, seconds in self.stage_times.items())
+        line = f"{self.mode} finished in {self.elapsed:.1f}s"
+        if stages:
+            line += f" | {stages}"
+        if self.gql_calls:
+            transferred = (self.gql_request_bytes + self.gql_response_bytes) / 2**20
+            line += f" | {sum(self.gql_calls.values())} GraphQL calls ({transferred:.1f} MB)"
+        if self.counters:
+            line += " | " + ", ".join(f"{count} {name}" for name, count in self.counters.items())
+        if self.failures:
+            line += f" ({', '.join(f'{count} {name}' for name, count in self.failures.items())})"
+        log.info(line)
+
+    def save(self, path, profile_path=None):
+        save_json(path, self.summary())
+        if self.profiler and profile_path:
+            self.profiler.dump_stats(profile_path)
+            log.info(f"Saved profile to {profile_path}, view it with 'python -m pstats {profile_path}'")
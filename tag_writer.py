@@ -0,0 +1,224 @@
+import os, json, time, uuid, threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+from plugin_state import utc_timestamp, remove_file
+
+import stashapi.log as log
+
+class TagWriteError(Exception):
+    pass
+
+def chunked(items, chunk_size):
+    if chunk_size < 1:
+        yield items
+        return
+    for i in range(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+class TagWriter:
+    """sends bulk performer tag updates to stash in bounded chunks on a small thread pool
+
+    each chunk is retried on its own so a failure never resends work that already
+    succeeded, queuing blocks once too many chunks are in flight
+    """
+    def __init__(self, stash, chunk_size=None, concurrency=None, retries=None) -> None:
+        self.stash = stash
+        self.chunk_size = chunk_size or getattr(config, "WRITE_CHUNK_SIZE", 500)
+        self.concurrency = concurrency or getattr(config, "WRITE_CONCURRENCY", 4)
+        self.retries = getattr(config, "WRITE_RETRIES", 3) if retries is None else retries
+
+        self.pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        self.in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.failed_chunks = []
+        self.ids_written = 0
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type:
+            # let chunks already sent finish but keep the original error
+            self.pool.shutdown()
+            return
+        self.wait()
+
+    def update(self, performer_ids, tag_enums, mode):
+        """queues a bulk update of tag_enums with mode ADD or REMOVE for performer_ids"""
+        self.update_ids(performer_ids, [enum.tag_id for enum in tag_enums], mode)
+
+    def update_ids(self, performer_ids, tag_ids, mode, on_written=None):
+        """queues a bulk update of tag_ids, on_written is called from a worker thread after each chunk is written"""
+        if not performer_ids or not tag_ids:
+            return
+        for chunk in chunked(list(performer_ids), self.chunk_size):
+            self.in_flight.acquire()
+            self.futures.append(self.pool.submit(self.write_chunk, chunk, tag_ids, mode, on_written))
+
+    def write_chunk(self, performer_ids, tag_ids, mode, on_written=None):
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    self.stash.update_performers({
+                        "ids": performer_ids,
+                        "tag_ids":{
+                            "ids": tag_ids,
+                            "mode": mode
+                        }
+                    })
+                    with self.lock:
+                        self.ids_written += len(performer_ids)
+                    if on_written:
+                        on_written()
+                    return
+                except Exception as e:
+                    if attempt == self.retries:
+                        log.error(f"{mode} of {len(tag_ids)} tag(s) on {len(performer_ids)} performer(s) failed after {attempt + 1} attempt(s): {e}")
+                        with self.lock:
+                            self.failed_chunks.append((performer_ids, tag_ids, mode))
+                        return
+                    log.warning(f"{mode} of {len(tag_ids)} tag(s) on {len(performer_ids)} performer(s) failed, retrying: {e}")
+                    time.sleep(2 ** attempt)
+        finally:
+            self.in_flight.release()
+
+    def wait(self):
+        """waits for every queued chunk, raises TagWriteError if any chunk failed all its retries"""
+        for future in self.futures:
+            future.result()
+        self.futures = []
+        self.pool.shutdown()
+
+        elapsed = time.perf_counter() - self.started
+        if self.ids_written:
+            log.info(f"Wrote {self.ids_written} performer tag update(s) in {elapsed:.1f}s ({self.ids_written / max(elapsed, 1e-9):.0f} ids/sec)")
+        if self.failed_chunks:
+            raise TagWriteError(f"{len(self.failed_chunks)} tag update chunk(s) could not be written")
+
+class PlanWriter:
+    """records tag updates to a JSON Lines plan file instead of sending them to stash
+
+    the first line is a header, ADD/REMOVE lines are replayed in order by apply_plan(),
+    MATCH lines list the performer ids computed for a tag on each page and are only informational
+    """
+    def __init__(self, path, fingerprint=None, watermark=None, journal_path=None) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self.watermark = watermark
+        self.journal_path = journal_path
+        self.plan_id = uuid.uuid4().hex
+        self.chunk_size = getattr(config, "WRITE_CHUNK_SIZE", 500)
+        self.file = None
+        self.id_counts = defaultdict(int)
+        self.requests = 0
+
+    def __enter__(self):
+        self.file = open(f"{self.path}.tmp", "w", encoding="utf-8")
+        # replayed with the same chunk size so the journal of a resumed write lines up with its chunks
+        self.write_line({
+            "plan_id": self.plan_id, "created": utc_timestamp(), "fingerprint": self.fingerprint,
+            "watermark": self.watermark, "chunk_size": self.chunk_size,
+        })
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.write_line({"summary": {"ADD": self.id_counts["ADD"], "REMOVE": self.id_counts["REMOVE"], "requests": self.requests}})
+        self.file.close()
+        if exc_type:
+            os.remove(self.file.name)
+            return
+        # the journal of the plan being replaced does not apply to this one
+        if self.journal_path:
+            remove_file(self.journal_path)
+        os.replace(self.file.name, self.path)
+        log.info(f"Planned {self.id_counts['ADD']} tag addition(s) and {self.id_counts['REMOVE']} removal(s) in {self.requests} request(s), saved to {self.path}")
+
+    def write_line(self, entry):
+        self.file.write(json.dumps(entry, separators=(",", ":")))
+        self.file.write("\n")
+
+    def update(self, performer_ids, tag_enums, mode):
+        if not performer_ids or not tag_enums:
+            return
+        performer_ids = list(performer_ids)
+        self.write_line({"mode": mode, "tags": [str(enum) for enum in tag_enums], "ids": performer_ids})
+        self.id_counts[mode] += len(performer_ids) * len(tag_enums)
+        self.requests += len(list(chunked(performer_ids, self.chunk_size)))
+
+    def add_matches(self, tag_updates, tag_enums):
+        for enum in tag_enums:
+            if performer_ids := tag_updates.get(enum):
+                self.write_line({"mode": "MATCH", "tags": [str(enum)], "ids": performer_ids})
+
+class Plan:
+    def __init__(self, path, header) -> None:
+        self.path = path
+        self.header = header
+
+    def updates(self):
+        """yields (mode, tag names, performer ids) for every ADD/REMOVE line in file order"""
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("mode") in ("ADD", "REMOVE"):
+                    yield entry["mode"], entry["tags"], entry["ids"]
+
+def read_plan(path):
+    """returns the Plan saved at path or None if there is none"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return Plan(path, header)
+
+class Journal:
+    """append only record of the plan chunks already written to stash
+
+    a write interrupted part way resumes with the chunks that are not in the journal,
+    ADD/REMOVE updates are idempotent so a chunk written twice does no harm.
+    entries carry the plan_id of their plan, entries left by any other plan are ignored
+    """
+    def __init__(self, path, plan_id) -> None:
+        self.path = path
+        self.plan_id = plan_id
+        self.done = set()
+        self.lock = threading.Lock()
+        self.file = None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        if plan_id and entry["plan"] == plan_id:
+                            self.done.add(entry["done"])
+                    except (ValueError, KeyError, TypeError):
+                        # a line cut short when the previous run died
+                        continue
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def record(self, key):
+        with self.lock:
+            self.file.write(json.dumps({"plan": self.plan_id, "done": key}))
+            self.file.write("\n")
+            self.file.flush()
+            self.done.add(key)